@@ -0,0 +1,56 @@
+from logging.config import fileConfig
+
+from sqlalchemy import create_engine, pool
+
+from alembic import context
+
+from secret import secret
+
+from sqlite.database import Base
+
+# Register every table on Base.metadata for autogenerate
+from sqlite import models  # noqa: F401
+
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def get_url() -> str:
+    """sqlalchemy.url when set (e.g. with -x / tests), else the sync URL"""
+    return config.get_main_option("sqlalchemy.url") or secret.SYNC_DATABASE_URL
+
+
+def run_migrations_offline() -> None:
+    """Emit the migrations as SQL, e.g. alembic upgrade head --sql"""
+    context.configure(
+        url=get_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connectable = create_engine(get_url(), poolclass=pool.NullPool)
+
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection, target_metadata=target_metadata
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,190 @@
+"""Generator watermarks, stats counters and attendance rollups
+
+Also adds the natural key of schedule_instances, the generator relies on
+it for ON CONFLICT DO NOTHING. Duplicate (schedule_id, date, start, end)
+rows created by the old generator are merged into the lowest id first.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 15:00:00.000001
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Every duplicate instance and the id of the instance it is merged into
+MERGE_STATEMENTS = (
+    """
+    CREATE TEMPORARY TABLE schedule_instance_duplicates AS
+    SELECT schedule_instances.id AS id, keepers.keep_id AS keep_id
+    FROM schedule_instances
+    JOIN (
+        SELECT
+            schedule_id,
+            date,
+            start_time_in_utc,
+            end_time_in_utc,
+            MIN(id) AS keep_id
+        FROM schedule_instances
+        GROUP BY schedule_id, date, start_time_in_utc, end_time_in_utc
+        HAVING COUNT(*) > 1
+    ) AS keepers
+        ON keepers.schedule_id = schedule_instances.schedule_id
+        AND keepers.date = schedule_instances.date
+        AND keepers.start_time_in_utc = schedule_instances.start_time_in_utc
+        AND keepers.end_time_in_utc = schedule_instances.end_time_in_utc
+    WHERE schedule_instances.id <> keepers.keep_id
+    """,
+    # A user on several of the duplicates is only added once
+    """
+    INSERT INTO schedule_instance_users (user_id, schedule_instance_id)
+    SELECT DISTINCT
+        schedule_instance_users.user_id,
+        schedule_instance_duplicates.keep_id
+    FROM schedule_instance_users
+    JOIN schedule_instance_duplicates
+        ON schedule_instance_duplicates.id
+        = schedule_instance_users.schedule_instance_id
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM schedule_instance_users AS kept
+        WHERE kept.user_id = schedule_instance_users.user_id
+        AND kept.schedule_instance_id = schedule_instance_duplicates.keep_id
+    )
+    """,
+    """
+    DELETE FROM schedule_instance_users
+    WHERE schedule_instance_id IN (
+        SELECT id FROM schedule_instance_duplicates
+    )
+    """,
+    """
+    UPDATE attendances
+    SET schedule_instance_id = (
+        SELECT keep_id
+        FROM schedule_instance_duplicates
+        WHERE schedule_instance_duplicates.id
+        = attendances.schedule_instance_id
+    )
+    WHERE schedule_instance_id IN (
+        SELECT id FROM schedule_instance_duplicates
+    )
+    """,
+    """
+    UPDATE attendance_tracking
+    SET schedule_instance_id = (
+        SELECT keep_id
+        FROM schedule_instance_duplicates
+        WHERE schedule_instance_duplicates.id
+        = attendance_tracking.schedule_instance_id
+    )
+    WHERE schedule_instance_id IN (
+        SELECT id FROM schedule_instance_duplicates
+    )
+    """,
+    """
+    DELETE FROM schedule_instances
+    WHERE id IN (SELECT id FROM schedule_instance_duplicates)
+    """,
+    "DROP TABLE schedule_instance_duplicates",
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "schedule_instance_watermarks",
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("last_schedule_id", sa.Integer(), nullable=True),
+        sa.Column(
+            "last_schedule_updated_at_in_utc",
+            sa.DateTime(timezone=True),
+            nullable=True,
+        ),
+        sa.Column(
+            "updated_at_in_utc", sa.DateTime(timezone=True), nullable=False
+        ),
+        sa.PrimaryKeyConstraint("date"),
+    )
+    op.create_table(
+        "stats_counters",
+        sa.Column(
+            "name",
+            sa.Enum(
+                "TEACHERS_COUNT",
+                "STUDENTS_COUNT",
+                "LOCATIONS_COUNT",
+                "SCHEDULES_COUNT",
+                "SCHEDULE_INSTANCES_COUNT",
+                name="stats_counter_name",
+            ),
+            nullable=False,
+        ),
+        sa.Column("value", sa.Integer(), nullable=False),
+        sa.Column(
+            "refreshed_at_in_utc", sa.DateTime(timezone=True), nullable=False
+        ),
+        sa.Column(
+            "updated_at_in_utc", sa.DateTime(timezone=True), nullable=False
+        ),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.create_table(
+        "attendance_rollups",
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("schedule_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("teacher_id", sa.Integer(), nullable=False),
+        sa.Column("location_id", sa.Integer(), nullable=False),
+        sa.Column("expected_count", sa.Integer(), nullable=False),
+        sa.Column("present_count", sa.Integer(), nullable=False),
+        sa.Column("late_count", sa.Integer(), nullable=False),
+        sa.Column("absent_count", sa.Integer(), nullable=False),
+        sa.Column(
+            "refreshed_at_in_utc", sa.DateTime(timezone=True), nullable=False
+        ),
+        sa.ForeignKeyConstraint(
+            ["location_id"], ["locations.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["schedule_id"], ["schedules.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["teacher_id"], ["users.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint(
+            "date", "schedule_id", "user_id", "teacher_id", "location_id"
+        ),
+    )
+    for statement in MERGE_STATEMENTS:
+        op.execute(sa.text(statement))
+
+    # Batch so SQLite, which cannot ALTER constraints, recreates the table
+    with op.batch_alter_table("schedule_instances") as batch_op:
+        batch_op.create_unique_constraint(
+            "uq_schedule_instances_schedule_id_date_times",
+            ["schedule_id", "date", "start_time_in_utc", "end_time_in_utc"],
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("schedule_instances") as batch_op:
+        batch_op.drop_constraint(
+            "uq_schedule_instances_schedule_id_date_times", type_="unique"
+        )
+    op.drop_table("attendance_rollups")
+    op.drop_table("stats_counters")
+    op.drop_table("schedule_instance_watermarks")
+
+    sa.Enum(name="stats_counter_name").drop(op.get_bind(), checkfirst=True)
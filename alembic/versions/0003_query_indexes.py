@@ -0,0 +1,85 @@
+"""Composite indexes matched to the query shapes in sqlite/crud
+
+Built CONCURRENTLY on Postgres so the hot tables stay writable, which
+cannot run inside a transaction, hence the autocommit block.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 15:00:00.000002
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = (
+    (
+        "ix_schedules_day_is_reoccurring",
+        "schedules",
+        ["day", "is_reoccurring"],
+    ),
+    ("ix_schedules_date", "schedules", ["date"]),
+    (
+        "ix_schedule_users_schedule_id_user_id",
+        "schedule_users",
+        ["schedule_id", "user_id"],
+    ),
+    (
+        "ix_schedule_instances_date_teacher_id",
+        "schedule_instances",
+        ["date", "teacher_id"],
+    ),
+    (
+        "ix_schedule_instance_users_schedule_instance_id_user_id",
+        "schedule_instance_users",
+        ["schedule_instance_id", "user_id"],
+    ),
+    (
+        "ix_attendances_schedule_instance_id_user_id",
+        "attendances",
+        ["schedule_instance_id", "user_id"],
+    ),
+    (
+        "ix_attendances_created_at_in_utc",
+        "attendances",
+        ["created_at_in_utc"],
+    ),
+    (
+        "ix_attendance_tracking_schedule_instance_id_user_id",
+        "attendance_tracking",
+        ["schedule_instance_id", "user_id"],
+    ),
+)
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index_name, table_name, columns in INDEXES:
+            op.create_index(
+                index_name,
+                table_name,
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index_name, table_name, _ in reversed(INDEXES):
+            op.drop_index(
+                index_name,
+                table_name=table_name,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,40 @@
+"""Index for the keyset pagination of schedule_instances by (date, id)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_schedule_instances_date_id",
+            "schedule_instances",
+            ["date", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_schedule_instances_date_id",
+            table_name="schedule_instances",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,136 @@
+"""Benchmark the attendance export's memory against the range it exports.
+
+Seeds a term of attendances, then exports growing date ranges of it as CSV
+and as Parquet through stream_attendance_export, discarding the chunks,
+and reports the bytes, the time and the tracemalloc peak of
+every run. The peak is expected to stay flat as the ranges grow.
+
+    python -m benchmarks.attendance_export_benchmark --weeks 4 12
+
+--database-url defaults to a throwaway SQLite file, pass a local Postgres
+URL (postgresql://...) for numbers that match production, its server side
+cursors are what keeps the peak flat there.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import (
+    configure_environment,
+    create_benchmark_engine,
+    seed,
+    seed_schedule_instances_and_attendances,
+)
+
+
+def get_async_database_url(database_url: str) -> str:
+    if database_url.startswith("postgresql"):
+        return database_url.replace("postgresql://", "postgresql+asyncpg://")
+
+    return database_url.replace("sqlite://", "sqlite+aiosqlite://")
+
+
+async def run_export(
+    database_url: str, start_date, end_date, file_format
+) -> dict:
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    from sqlite.crud.attendance_exports import stream_attendance_export
+
+    engine = create_async_engine(get_async_database_url(database_url))
+
+    bytes_count = 0
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    async with AsyncSession(engine) as db:
+        async for chunk in stream_attendance_export(
+            start_date=start_date,
+            end_date=end_date,
+            file_format=file_format,
+            db=db,
+        ):
+            bytes_count += len(chunk)
+    elapsed_seconds = time.perf_counter() - started_at
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    await engine.dispose()
+
+    return {
+        "bytes": bytes_count,
+        "seconds": round(elapsed_seconds, 3),
+        "peak_mb": round(peak / 1024 / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--schedules", type=int, default=2000)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--min-students", type=int, default=10)
+    parser.add_argument("--max-students", type=int, default=60)
+    parser.add_argument("--weeks", type=int, nargs="+", default=[1, 4, 12])
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    database_url = args.database_url or (
+        "sqlite:///" + os.path.join(tempfile.mkdtemp(), "export.db")
+    )
+    configure_environment(database_url=database_url)
+
+    from sqlite.enums import AttendanceExportFormatEnum
+
+    engine = create_benchmark_engine(database_url=database_url)
+    now = datetime.now(tz=timezone.utc)
+    seeded = seed(
+        engine=engine,
+        on_date=now.date(),
+        schedules_count=args.schedules,
+        students_count=args.students,
+        min_students_per_schedule=args.min_students,
+        max_students_per_schedule=args.max_students,
+    )
+    print(f"Seeded {seeded}")
+    seed_schedule_instances_and_attendances(
+        engine=engine, now=now, weeks=max(args.weeks)
+    )
+    engine.dispose()
+
+    results = []
+    print(
+        f"{'weeks':>6}{'format':>9}{'MB out':>9}{'seconds':>9}{'peak MB':>9}"
+    )
+    for weeks in args.weeks:
+        for file_format in AttendanceExportFormatEnum:
+            result = {"weeks": weeks, "format": file_format.value}
+            result.update(
+                asyncio.run(
+                    run_export(
+                        database_url=database_url,
+                        start_date=now.date() - timedelta(weeks=weeks),
+                        end_date=now.date(),
+                        file_format=file_format,
+                    )
+                )
+            )
+            results.append(result)
+            print(
+                f"{weeks:>6}{file_format.value:>9}"
+                f"{result['bytes'] / 1024 / 1024:>9.1f}"
+                f"{result['seconds']:>9}{result['peak_mb']:>9}"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import os
+import random
+import resource
+import time
+from datetime import date, datetime, timedelta, time as dttime
+
+from sqlalchemy import Engine, create_engine, event, insert
+
+
+def configure_environment(database_url: str) -> None:
+    """Provide the settings secret.py expects before any repo import.
+
+    sqlite/database.py builds the async engine at import time, so for a
+    SQLite stand-in it is pointed at an (unused, never connected) asyncpg
+    URL instead.
+    """
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+    os.environ.setdefault(
+        "DATABASE_URL",
+        (
+            database_url.replace("postgresql://", "postgresql+asyncpg://")
+            if database_url.startswith("postgresql")
+            else "postgresql+asyncpg://benchmark@localhost/benchmark"
+        ),
+    )
+
+
+def create_benchmark_engine(database_url: str) -> Engine:
+    from sqlite import models
+
+    engine = create_engine(database_url)
+    models.Base.metadata.create_all(engine)
+
+    return engine
+
+
+class QueryCounter:
+    """Counts the statements an engine executes"""
+
+    def __init__(self, engine: Engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+
+def get_peak_rss_in_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def seed(
+    engine: Engine,
+    on_date: date,
+    schedules_count: int,
+    students_count: int,
+    min_students_per_schedule: int,
+    max_students_per_schedule: int,
+    teachers_count: int = 100,
+    locations_count: int = 50,
+    batch_size: int = 10000,
+    random_seed: int = 42,
+) -> dict:
+    """Insert synthetic users, locations, schedules and schedule_users.
+
+    Every schedule is a reoccurring one on on_date's day of the week, so
+    all of them are due when the generator runs for on_date.
+    """
+    from sqlite import models
+    from utils.date_utils import return_day_of_week_name
+
+    rng = random.Random(random_seed)
+    day = return_day_of_week_name(date=on_date)
+    started_at = time.perf_counter()
+
+    with engine.begin() as connection:
+        connection.execute(
+            insert(models.UserModel),
+            [
+                {
+                    "id": i,
+                    "full_name": f"Teacher {i}",
+                    "email": f"teacher{i}@benchmark.local",
+                    "password": "not-a-hash",
+                    "is_student": False,
+                }
+                for i in range(1, teachers_count + 1)
+            ],
+        )
+        connection.execute(
+            insert(models.UserModel),
+            [
+                {
+                    "id": teachers_count + i,
+                    "full_name": f"Student {i}",
+                    "email": f"student{i}@benchmark.local",
+                    "password": "not-a-hash",
+                    "is_student": True,
+                }
+                for i in range(1, students_count + 1)
+            ],
+        )
+        connection.execute(
+            insert(models.LocationModel),
+            [
+                {
+                    "id": i,
+                    "title": f"Room {i}",
+                    "bluetooth_address": (
+                        f"00:00:00:00:{i // 256:02X}:{i % 256:02X}"
+                    ),
+                    "coordinates": f"{i},{i}",
+                }
+                for i in range(1, locations_count + 1)
+            ],
+        )
+
+        student_ids = range(
+            teachers_count + 1, teachers_count + students_count + 1
+        )
+        schedule_users_count = 0
+        for first_id in range(1, schedules_count + 1, batch_size):
+            schedule_ids = range(
+                first_id, min(first_id + batch_size, schedules_count + 1)
+            )
+            schedule_rows = []
+            schedule_user_rows = []
+            for schedule_id in schedule_ids:
+                teacher_id = rng.randint(1, teachers_count)
+                start_hour = rng.randint(6, 20)
+                schedule_rows.append(
+                    {
+                        "id": schedule_id,
+                        "teacher_id": teacher_id,
+                        "location_id": rng.randint(1, locations_count),
+                        "title": f"Course {schedule_id}",
+                        "is_reoccurring": True,
+                        "date": None,
+                        "day": day,
+                        "start_time_in_utc": dttime(start_hour),
+                        "end_time_in_utc": dttime(start_hour + 1),
+                    }
+                )
+                schedule_user_rows.append(
+                    {"user_id": teacher_id, "schedule_id": schedule_id}
+                )
+                schedule_user_rows.extend(
+                    {"user_id": student_id, "schedule_id": schedule_id}
+                    for student_id in rng.sample(
+                        student_ids,
+                        rng.randint(
+                            min_students_per_schedule,
+                            max_students_per_schedule,
+                        ),
+                    )
+                )
+
+            connection.execute(insert(models.ScheduleModel), schedule_rows)
+            for i in range(0, len(schedule_user_rows), batch_size):
+                connection.execute(
+                    insert(models.ScheduleUserModel),
+                    schedule_user_rows[i : i + batch_size],
+                )
+            schedule_users_count += len(schedule_user_rows)
+
+    return {
+        "schedules": schedules_count,
+        "students": students_count,
+        "schedule_users": schedule_users_count,
+        "seed_seconds": round(time.perf_counter() - started_at, 2),
+    }
+
+
+def seed_schedule_instances_and_attendances(
+    engine, now: datetime, weeks: int
+) -> list[int]:
+    """Spread the schedules over the week and materialize a term of them.
+
+    Every other student is marked present, at the time of the class, so
+    the dates and created_at of the rows are as selective as in production.
+    """
+    import celery_worker
+    from sqlalchemy import DateTime, insert, literal, select, update
+    from sqlalchemy.orm import Session
+
+    from sqlite import models
+    from sqlite.enums import AttendanceEnum, DaysEnum
+    from utils.date_utils import return_day_of_week_name
+
+    days = list(DaysEnum)
+    today_index = days.index(return_day_of_week_name(date=now.date()))
+
+    with Session(engine) as db:
+        for offset in range(len(days)):
+            db.execute(
+                update(models.ScheduleModel)
+                .where(models.ScheduleModel.id % len(days) == offset)
+                .values(day=days[(today_index + offset) % len(days)])
+            )
+
+        for week in range(weeks, -1, -1):
+            on_date = now.date() - timedelta(weeks=week)
+            summary = celery_worker.materialize_schedule_instances(
+                on_date=on_date, now=now, db=db
+            )
+            if not summary["inserted_schedule_instances"]:
+                continue
+
+            db.execute(
+                insert(models.AttendanceModel).from_select(
+                    [
+                        "user_id",
+                        "schedule_instance_id",
+                        "attendance_status",
+                        "created_at_in_utc",
+                    ],
+                    select(
+                        models.ScheduleInstanceUserModel.user_id,
+                        models.ScheduleInstanceUserModel.schedule_instance_id,
+                        literal(
+                            AttendanceEnum.PRESENT,
+                            models.AttendanceModel.attendance_status.type,
+                        ),
+                        literal(
+                            now - timedelta(weeks=week, hours=1),
+                            DateTime(timezone=True),
+                        ),
+                    )
+                    .join(
+                        models.ScheduleInstanceModel,
+                        models.ScheduleInstanceModel.id
+                        == models.ScheduleInstanceUserModel.schedule_instance_id,  # noqa: E501
+                    )
+                    .where(
+                        models.ScheduleInstanceModel.date == on_date,
+                        models.ScheduleInstanceUserModel.user_id % 2 == 0,
+                    ),
+                )
+            )
+        db.commit()
+
+        return db.scalars(
+            select(models.ScheduleInstanceModel.id)
+            .order_by(models.ScheduleInstanceModel.id.desc())
+            .limit(50)
+        ).all()
@@ -0,0 +1,261 @@
+"""Check that the hot CRUD queries are planned on the expected indexes.
+
+Seeds synthetic schedules, materializes a term of their instances and
+marks attendance for part of them, then runs EXPLAIN (EXPLAIN QUERY PLAN on
+SQLite) for each query and fails when none of its expected indexes is
+used. Meant as a regression check after changing queries or indexes.
+
+    python -m benchmarks.explain_check --schedules 5000
+
+--database-url defaults to a throwaway SQLite file, pass a local Postgres
+URL (postgresql://...) to check the plans production would get. Tiny
+seeds let Postgres prefer sequential scans, keep --schedules realistic.
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import (
+    configure_environment,
+    create_benchmark_engine,
+    seed,
+    seed_schedule_instances_and_attendances,
+)
+
+# Postgres names plain unique constraints uq_..., SQLite autoindex_...
+SCHEDULE_INSTANCES_NATURAL_KEY_INDEXES = (
+    "uq_schedule_instances_schedule_id_date_times",
+    "sqlite_autoindex_schedule_instances_1",
+)
+# (user_id, schedule_instance_id)
+SCHEDULE_INSTANCE_USERS_PRIMARY_KEY_INDEXES = (
+    "schedule_instance_users_pkey",
+    "sqlite_autoindex_schedule_instance_users_1",
+)
+
+INDEX_NAME_PATTERN = re.compile(
+    r"\b(ix_\w+|uq_\w+|sqlite_autoindex_\w+|\w+_pkey)\b"
+)
+
+
+def get_checks(
+    now: datetime,
+    user_id: int,
+    schedule_instance_ids: list[int],
+    dialect_name: str,
+):
+    """(name, statement, indexes of which at least one has to be used)"""
+    from sqlite.crud import (
+        analytics,
+        attendance,
+        attendance_exports,
+        attendance_tracking,
+        schedule_instances,
+        schedules,
+    )
+    from utils.pagination import (
+        encode_cursor,
+        get_keyset_order_columns,
+        get_keyset_page_query,
+    )
+
+    today = now.date()
+    schedule_instances_query = (
+        schedule_instances.get_all_schedule_instances_query()
+    )
+
+    return [
+        (
+            "schedule_instances by date",
+            schedule_instances.get_all_schedule_instances_by_date_query(
+                date=today
+            ),
+            (
+                "ix_schedule_instances_date_teacher_id",
+                "ix_schedule_instances_date_id",
+            ),
+        ),
+        (
+            "schedule_instances keyset page",
+            get_keyset_page_query(
+                query=schedule_instances_query,
+                cursor=encode_cursor(
+                    values=(
+                        today - timedelta(weeks=4),
+                        schedule_instance_ids[0],
+                    )
+                ),
+                size=50,
+                order_columns=get_keyset_order_columns(
+                    query=schedule_instances_query
+                ),
+            ),
+            ("ix_schedule_instances_date_id",),
+        ),
+        (
+            "schedule_instances by date range and user",
+            schedule_instances.get_all_schedule_instance_by_date_range_and_user_id_query(  # noqa: E501
+                start_date=today - timedelta(days=7),
+                end_date=today,
+                user_id=user_id,
+                db=None,
+            ),
+            SCHEDULE_INSTANCE_USERS_PRIMARY_KEY_INDEXES,
+        ),
+        (
+            "today's schedule_instances of a user",
+            schedule_instances.get_today_schedule_instances_by_user_id_query(
+                user_id=user_id
+            ),
+            SCHEDULE_INSTANCE_USERS_PRIMARY_KEY_INDEXES,
+        ),
+        (
+            "today's schedules",
+            schedules.get_today_schedules_query(),
+            ("ix_schedules_day_is_reoccurring", "ix_schedules_date"),
+        ),
+        (
+            "generator, missing instances",
+            schedule_instances.get_missing_schedule_instances_insert_query(
+                date=today, now=now, dialect_name=dialect_name
+            ),
+            SCHEDULE_INSTANCES_NATURAL_KEY_INDEXES,
+        ),
+        (
+            "generator, instance users",
+            schedule_instances.get_schedule_instance_users_insert_query(
+                schedule_instance_ids=schedule_instance_ids,
+                dialect_name=dialect_name,
+            ),
+            ("ix_schedule_users_schedule_id_user_id",),
+        ),
+        (
+            "roster sync, stale instance users",
+            schedule_instances.get_schedule_roster_sync_delete_query(
+                schedule_id=1, from_date=today
+            ),
+            ("ix_schedule_instance_users_schedule_instance_id_user_id",),
+        ),
+        (
+            "attendances by instances",
+            attendance.get_all_attendance_by_schedule_instance_ids_query(
+                schedule_ids=schedule_instance_ids
+            ),
+            ("ix_attendances_schedule_instance_id_user_id",),
+        ),
+        (
+            "attendance by instance and user",
+            attendance.get_attendance_by_schedule_instance_id_and_user_id_query(  # noqa: E501
+                schedule_instance_id=schedule_instance_ids[0],
+                user_id=user_id,
+            ),
+            ("ix_attendances_schedule_instance_id_user_id",),
+        ),
+        (
+            "attendance tracking by instance",
+            attendance_tracking.get_all_attendance_tracking_by_schedule_instance_id_query(  # noqa: E501
+                schedule_instance_id=schedule_instance_ids[0]
+            ),
+            ("ix_attendance_tracking_schedule_instance_id_user_id",),
+        ),
+        (
+            "rollups, dates with new attendances",
+            analytics.get_attendance_dates_changed_since_query(
+                since=now - timedelta(minutes=10)
+            ),
+            ("ix_attendances_created_at_in_utc",),
+        ),
+        (
+            "attendance export by date range",
+            attendance_exports.get_attendance_export_query(
+                start_date=today - timedelta(weeks=4), end_date=today
+            ),
+            ("ix_schedule_instances_date_id",),
+        ),
+    ]
+
+
+def explain(connection, statement) -> str:
+    sql = str(
+        statement.compile(
+            dialect=connection.dialect,
+            compile_kwargs={"literal_binds": True},
+        )
+    )
+    prefix = (
+        "EXPLAIN QUERY PLAN"
+        if connection.dialect.name == "sqlite"
+        else "EXPLAIN"
+    )
+    rows = connection.exec_driver_sql(f"{prefix} {sql}").all()
+
+    return "\n".join(" ".join(str(value) for value in row) for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--schedules", type=int, default=5000)
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--min-students", type=int, default=10)
+    parser.add_argument("--max-students", type=int, default=60)
+    parser.add_argument("--weeks", type=int, default=12)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    database_url = args.database_url or (
+        "sqlite:///" + os.path.join(tempfile.mkdtemp(), "explain.db")
+    )
+    configure_environment(database_url=database_url)
+
+    engine = create_benchmark_engine(database_url=database_url)
+    now = datetime.now(tz=timezone.utc)
+
+    seeded = seed(
+        engine=engine,
+        on_date=now.date(),
+        schedules_count=args.schedules,
+        students_count=args.students,
+        min_students_per_schedule=args.min_students,
+        max_students_per_schedule=args.max_students,
+    )
+    print(f"Seeded {seeded}")
+    schedule_instance_ids = seed_schedule_instances_and_attendances(
+        engine=engine, now=now, weeks=args.weeks
+    )
+
+    failures = 0
+    with engine.connect() as connection:
+        connection.exec_driver_sql(
+            "ANALYZE" if engine.dialect.name != "sqlite" else "ANALYZE main"
+        )
+
+        # A student, the seeded teachers are ids 1 to 100
+        for name, statement, expected_indexes in get_checks(
+            now=now,
+            user_id=101,
+            schedule_instance_ids=schedule_instance_ids,
+            dialect_name=engine.dialect.name,
+        ):
+            plan = explain(connection=connection, statement=statement)
+            used_indexes = sorted(set(INDEX_NAME_PATTERN.findall(plan)))
+            is_ok = any(index in used_indexes for index in expected_indexes)
+            failures += not is_ok
+
+            print(
+                f"{'ok' if is_ok else 'FAIL':<6}{name:<44}"
+                f"{', '.join(used_indexes) or '-'}"
+            )
+            if args.verbose or not is_ok:
+                print(f"      expected one of {', '.join(expected_indexes)}")
+                print("      " + plan.replace("\n", "\n      "))
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
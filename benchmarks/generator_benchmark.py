@@ -0,0 +1,153 @@
+"""Benchmark the schedule instance generator against a local database.
+
+Seeds synthetic users, locations, schedules and schedule_users, then runs
+the generator cold (nothing materialized yet) and warm (everything already
+materialized) in both the full and the incremental mode.
+
+    python -m benchmarks.generator_benchmark --schedules 10000 \\
+        --min-students 10 --max-students 200 --output baseline.json
+
+    python -m benchmarks.generator_benchmark --schedules 10000 \\
+        --min-students 10 --max-students 200 --baseline baseline.json
+
+--database-url defaults to a throwaway SQLite file, pass a local Postgres
+URL (postgresql://...) for numbers that match production.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.common import (
+    QueryCounter,
+    configure_environment,
+    create_benchmark_engine,
+    get_peak_rss_in_mb,
+    seed,
+)
+
+
+def run_generator(engine, counter: QueryCounter, mode: str, run: str):
+    import celery_worker
+    from sqlalchemy.orm import Session
+
+    now = datetime.now(tz=timezone.utc)
+    queries_before = counter.count
+    started_at = time.perf_counter()
+
+    with Session(engine) as db:
+        if mode == "incremental":
+            summary = (
+                celery_worker.materialize_schedule_instances_incrementally(
+                    on_date=now.date(), now=now, db=db
+                )
+            )
+        else:
+            summary = celery_worker.materialize_schedule_instances(
+                on_date=now.date(), now=now, db=db
+            )
+        db.commit()
+
+    return {
+        "mode": mode,
+        "run": run,
+        "wall_seconds": round(time.perf_counter() - started_at, 4),
+        "queries": counter.count - queries_before,
+        "rows_written": summary["inserted_schedule_instances"]
+        + summary["inserted_schedule_instance_users"],
+        "peak_rss_mb": get_peak_rss_in_mb(),
+    }
+
+
+def reset_generated_rows(engine) -> None:
+    from sqlalchemy import delete
+
+    from sqlite import models
+
+    with engine.begin() as connection:
+        connection.execute(delete(models.ScheduleInstanceUserModel))
+        connection.execute(delete(models.ScheduleInstanceModel))
+        connection.execute(delete(models.ScheduleInstanceWatermarkModel))
+
+
+def print_results(results: list[dict], baseline: list[dict] | None) -> None:
+    baseline_by_key = {
+        (result["mode"], result["run"]): result for result in baseline or []
+    }
+
+    print(
+        f"{'mode':<12}{'run':<6}{'wall s':>10}{'queries':>10}"
+        f"{'rows':>12}{'rss MB':>10}{'vs baseline':>14}"
+    )
+    for result in results:
+        previous = baseline_by_key.get((result["mode"], result["run"]))
+        delta = (
+            f"{(result['wall_seconds'] / previous['wall_seconds'] - 1):+.1%}"
+            if previous and previous["wall_seconds"]
+            else "-"
+        )
+        print(
+            f"{result['mode']:<12}{result['run']:<6}"
+            f"{result['wall_seconds']:>10}{result['queries']:>10}"
+            f"{result['rows_written']:>12}{result['peak_rss_mb']:>10}"
+            f"{delta:>14}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--schedules", type=int, default=1000)
+    parser.add_argument("--students", type=int, default=None)
+    parser.add_argument("--min-students", type=int, default=10)
+    parser.add_argument("--max-students", type=int, default=200)
+    parser.add_argument("--modes", nargs="+", default=["full", "incremental"])
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Compare against a results JSON")
+    args = parser.parse_args()
+
+    database_url = args.database_url or (
+        "sqlite:///" + os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    )
+    configure_environment(database_url=database_url)
+
+    engine = create_benchmark_engine(database_url=database_url)
+    counter = QueryCounter(engine=engine)
+
+    seeded = seed(
+        engine=engine,
+        on_date=datetime.now(tz=timezone.utc).date(),
+        schedules_count=args.schedules,
+        students_count=args.students or args.max_students * 10,
+        min_students_per_schedule=args.min_students,
+        max_students_per_schedule=args.max_students,
+    )
+    print(f"Seeded {seeded}")
+
+    results = []
+    for mode in args.modes:
+        reset_generated_rows(engine=engine)
+        for run in ("cold", "warm"):
+            results.append(
+                run_generator(
+                    engine=engine, counter=counter, mode=mode, run=run
+                )
+            )
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    print_results(results=results, baseline=baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"seeded": seeded, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
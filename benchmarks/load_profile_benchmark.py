@@ -0,0 +1,152 @@
+"""Benchmark the schedule instance load profiles on the list queries.
+
+Seeds synthetic schedules and a term of their instances, then loads a page
+of get_all_schedule_instances_query with every load profile and serializes
+it with the profile's schema, the way the list endpoints do:
+
+    columns   width of the main result set
+    queries   statements per page (DETAIL selectinloads the schedules)
+    ms        median wall time of the load and the serialization
+    kb        size of the serialized page
+
+    python -m benchmarks.load_profile_benchmark --rows 1000
+
+--database-url defaults to a throwaway SQLite file, pass a local Postgres
+URL (postgresql://...) for numbers that match production.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.common import (
+    configure_environment,
+    create_benchmark_engine,
+    seed,
+    seed_schedule_instances_and_attendances,
+)
+
+
+class ResultSetWidths:
+    """Column count of every result set an engine returns"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.widths = []
+        event.listen(engine, "after_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, *args, **kwargs):
+        if cursor.description:
+            self.widths.append(len(cursor.description))
+
+
+def run_profile(engine, widths: ResultSetWidths, profile, rows: int, repeats):
+    from sqlalchemy.orm import Session
+
+    from sqlite.crud import schedule_instances
+    from sqlite.schemas import SCHEDULE_INSTANCE_SCHEMAS
+
+    schema = SCHEDULE_INSTANCE_SCHEMAS[profile]
+    query = (
+        schedule_instances.get_all_schedule_instances_query(profile=profile)
+        .order_by(None)
+        .limit(rows)
+    )
+
+    timings = []
+    for _ in range(repeats):
+        widths.widths.clear()
+        started_at = time.perf_counter()
+
+        # A fresh session per run, like a request
+        with Session(engine) as db:
+            items = db.scalars(query).unique().all()
+            payload = json.dumps(
+                [
+                    schema.model_validate(item).model_dump(mode="json")
+                    for item in items
+                ]
+            )
+
+        timings.append((time.perf_counter() - started_at) * 1000)
+
+    return {
+        "profile": profile.value,
+        "rows": len(items),
+        "columns": widths.widths[0],
+        "queries": len(widths.widths),
+        "ms": round(statistics.median(timings), 2),
+        "kb": round(len(payload) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--schedules", type=int, default=2000)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--min-students", type=int, default=10)
+    parser.add_argument("--max-students", type=int, default=60)
+    parser.add_argument("--weeks", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    database_url = args.database_url or (
+        "sqlite:///" + os.path.join(tempfile.mkdtemp(), "load_profile.db")
+    )
+    configure_environment(database_url=database_url)
+
+    from sqlite.enums import ScheduleInstanceLoadProfileEnum
+
+    engine = create_benchmark_engine(database_url=database_url)
+    now = datetime.now(tz=timezone.utc)
+
+    seed(
+        engine=engine,
+        on_date=now.date(),
+        schedules_count=args.schedules,
+        students_count=args.students,
+        min_students_per_schedule=args.min_students,
+        max_students_per_schedule=args.max_students,
+    )
+    seed_schedule_instances_and_attendances(
+        engine=engine, now=now, weeks=args.weeks
+    )
+
+    widths = ResultSetWidths(engine=engine)
+    results = [
+        run_profile(
+            engine=engine,
+            widths=widths,
+            profile=profile,
+            rows=args.rows,
+            repeats=args.repeats,
+        )
+        for profile in ScheduleInstanceLoadProfileEnum
+    ]
+
+    print(
+        f"{'profile':<9}{'rows':>6}{'columns':>9}{'queries':>9}"
+        f"{'ms':>9}{'kb':>8}"
+    )
+    for result in results:
+        print(
+            f"{result['profile']:<9}{result['rows']:>6}"
+            f"{result['columns']:>9}{result['queries']:>9}"
+            f"{result['ms']:>9}{result['kb']:>8}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
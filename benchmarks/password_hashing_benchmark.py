@@ -0,0 +1,93 @@
+"""Benchmark the event loop's responsiveness during a login storm.
+
+Verifies --logins bcrypt passwords concurrently, once inline on the event
+loop (the old verify_password) and once through verify_password_async,
+while a heartbeat coroutine measures how late the loop wakes it up:
+
+    max lag   worst delay of a 10 ms sleep, what other requests wait for
+    wall s    until every login is verified
+
+    python -m benchmarks.password_hashing_benchmark --logins 20
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import configure_environment
+
+HEARTBEAT_INTERVAL_IN_SECONDS = 0.01
+
+
+async def heartbeat(lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started_at = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_INTERVAL_IN_SECONDS)
+        lags.append(
+            time.perf_counter() - started_at - HEARTBEAT_INTERVAL_IN_SECONDS
+        )
+
+
+async def run_storm(mode: str, logins: int, hashed_password: str) -> dict:
+    from utils.password import verify_password, verify_password_async
+
+    async def login() -> bool:
+        if mode == "inline":
+            return verify_password(
+                plain_password="password", hashed_password=hashed_password
+            )
+        return await verify_password_async(
+            plain_password="password", hashed_password=hashed_password
+        )
+
+    lags = []
+    stop = asyncio.Event()
+    heartbeat_task = asyncio.create_task(heartbeat(lags=lags, stop=stop))
+    # Let the heartbeat start first
+    await asyncio.sleep(HEARTBEAT_INTERVAL_IN_SECONDS)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    wall_seconds = time.perf_counter() - started_at
+
+    stop.set()
+    await heartbeat_task
+
+    return {
+        "mode": mode,
+        "logins": logins,
+        "max_lag_ms": round(max(lags, default=0) * 1000, 1),
+        "wall_seconds": round(wall_seconds, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=20)
+    args = parser.parse_args()
+
+    configure_environment(database_url="sqlite:///unused.db")
+
+    from secret import secret
+    from utils.password import get_password_hash
+
+    hashed_password = get_password_hash(password="password")
+
+    print(f"pool workers {secret.PASSWORD_HASHING_MAX_WORKERS}")
+    print(f"{'mode':<8}{'logins':>8}{'max lag ms':>12}{'wall s':>9}")
+    for mode in ("inline", "pool"):
+        result = asyncio.run(
+            run_storm(
+                mode=mode,
+                logins=args.logins,
+                hashed_password=hashed_password,
+            )
+        )
+        print(
+            f"{result['mode']:<8}{result['logins']:>8}"
+            f"{result['max_lag_ms']:>12}{result['wall_seconds']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
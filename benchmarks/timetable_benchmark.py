@@ -0,0 +1,212 @@
+"""Benchmark the per-user timetable filter against the total instance count.
+
+Seeds the same schedules and rosters at several term lengths, so the
+students' own classes stay put while schedule_instances grows, and times
+the user filter of the timetable queries for the students with the fewest
+and the most classes:
+
+    legacy   EXISTS through academic_users, i.e. a join with users
+    current  get_schedule_instance_ids_by_user_id_query, a semi-join on
+             the schedule_instance_users primary key
+
+    python -m benchmarks.timetable_benchmark --weeks 4 16 32
+
+--database-url defaults to a throwaway SQLite file per term length, pass a
+local Postgres URL (postgresql://...) for numbers that match production.
+Its tables are dropped and recreated for every term length.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import (
+    configure_environment,
+    create_benchmark_engine,
+    seed,
+    seed_schedule_instances_and_attendances,
+)
+
+
+def get_timetable_queries(user_id: int, start_date, end_date) -> dict:
+    from sqlalchemy import or_, select
+
+    from sqlite import models
+    from sqlite.crud import schedule_instances
+
+    date_filter = (
+        models.ScheduleInstanceModel.date >= start_date,
+        models.ScheduleInstanceModel.date <= end_date,
+    )
+
+    return {
+        "legacy": select(models.ScheduleInstanceModel.id).where(
+            *date_filter,
+            or_(
+                models.ScheduleInstanceModel.academic_users.any(
+                    models.UserModel.id == user_id
+                ),
+                models.ScheduleInstanceModel.teacher_id == user_id,
+            ),
+        ),
+        "current": select(models.ScheduleInstanceModel.id).where(
+            *date_filter,
+            models.ScheduleInstanceModel.id.in_(
+                schedule_instances.get_schedule_instance_ids_by_user_id_query(
+                    user_id=user_id, start_date=start_date, end_date=end_date
+                )
+            ),
+        ),
+    }
+
+
+def get_students_with_fewest_and_most_classes(connection) -> list[tuple]:
+    from sqlalchemy import func, select
+
+    from sqlite import models
+
+    classes_count = func.count().label("classes_count")
+    query = (
+        select(models.ScheduleInstanceUserModel.user_id, classes_count)
+        .join(
+            models.UserModel,
+            models.UserModel.id == models.ScheduleInstanceUserModel.user_id,
+        )
+        .where(models.UserModel.is_student.is_(True))
+        .group_by(models.ScheduleInstanceUserModel.user_id)
+    )
+
+    fewest = connection.execute(query.order_by(classes_count).limit(1)).one()
+    most = connection.execute(
+        query.order_by(classes_count.desc()).limit(1)
+    ).one()
+
+    return [tuple(fewest), tuple(most)]
+
+
+def time_query(connection, query, repeats: int) -> tuple[float, int]:
+    """Median wall time in ms and the number of rows"""
+    timings = []
+    for _ in range(repeats):
+        started_at = time.perf_counter()
+        rows = connection.execute(query).all()
+        timings.append((time.perf_counter() - started_at) * 1000)
+
+    return round(statistics.median(timings), 3), len(rows)
+
+
+def run_term(args, database_url: str, weeks: int) -> list[dict]:
+    from sqlalchemy import func, select
+
+    from sqlite import models
+
+    engine = create_benchmark_engine(database_url=database_url)
+    models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+
+    now = datetime.now(tz=timezone.utc)
+    seed(
+        engine=engine,
+        on_date=now.date(),
+        schedules_count=args.schedules,
+        students_count=args.students,
+        min_students_per_schedule=args.min_students,
+        max_students_per_schedule=args.max_students,
+    )
+    seed_schedule_instances_and_attendances(
+        engine=engine, now=now, weeks=weeks
+    )
+
+    results = []
+    with engine.connect() as connection:
+        connection.exec_driver_sql(
+            "ANALYZE" if engine.dialect.name != "sqlite" else "ANALYZE main"
+        )
+        instances_count = connection.scalar(
+            select(func.count()).select_from(models.ScheduleInstanceModel)
+        )
+
+        for (
+            user_id,
+            classes_count,
+        ) in get_students_with_fewest_and_most_classes(connection=connection):
+            # The whole term and today, the two timetable views
+            for view, start_date in (
+                ("term", now.date() - timedelta(weeks=weeks)),
+                ("today", now.date()),
+            ):
+                result = {
+                    "weeks": weeks,
+                    "instances": instances_count,
+                    "user_id": user_id,
+                    "user_classes": classes_count,
+                    "view": view,
+                }
+                queries = get_timetable_queries(
+                    user_id=user_id, start_date=start_date, end_date=now.date()
+                )
+                for name, query in queries.items():
+                    result[f"{name}_ms"], result["rows"] = time_query(
+                        connection=connection,
+                        query=query,
+                        repeats=args.repeats,
+                    )
+                results.append(result)
+
+    engine.dispose()
+
+    return results
+
+
+def print_results(results: list[dict]) -> None:
+    print(
+        f"{'weeks':>6}{'instances':>11}{'user':>8}{'classes':>9}"
+        f"{'view':>7}{'rows':>6}{'legacy ms':>11}{'current ms':>12}"
+    )
+    for result in results:
+        print(
+            f"{result['weeks']:>6}{result['instances']:>11}"
+            f"{result['user_id']:>8}{result['user_classes']:>9}"
+            f"{result['view']:>7}{result['rows']:>6}"
+            f"{result['legacy_ms']:>11}{result['current_ms']:>12}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--schedules", type=int, default=2000)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--min-students", type=int, default=10)
+    parser.add_argument("--max-students", type=int, default=60)
+    parser.add_argument("--weeks", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    configure_environment(
+        database_url=args.database_url or "sqlite:///unused.db"
+    )
+
+    results = []
+    for weeks in args.weeks:
+        database_url = args.database_url or (
+            "sqlite:///" + os.path.join(tempfile.mkdtemp(), "timetable.db")
+        )
+        results.extend(
+            run_term(args=args, database_url=database_url, weeks=weeks)
+        )
+
+    print_results(results=results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+from celery import Celery
+
+from secret import secret
+
+
+# Shared by the worker and by the API, which only publishes tasks by name
+celery = Celery(
+    "celery_worker",
+    broker=secret.REDIS_URL,
+    backend=secret.REDIS_URL,
+)
+
+
+def publish_schedule_changed(schedule_id: int) -> None:
+    """Ask the worker to materialize and reconcile a single schedule"""
+    try:
+        celery.send_task(
+            "celery_worker.reconcile_schedule_instances",
+            kwargs={"schedule_id": schedule_id},
+        )
+    except Exception as e:
+        # The periodic task is the safety net, never fail the request
+        print("There seems to be an error")
+        print(e)
+
+
+def publish_schedules_changed(schedule_ids: list[int]) -> None:
+    """Ask the worker to materialize the schedules of a bulk create at once"""
+    try:
+        celery.send_task(
+            "celery_worker.reconcile_created_schedule_instances",
+            kwargs={"schedule_ids": schedule_ids},
+        )
+    except Exception as e:
+        # The periodic task is the safety net, never fail the request
+        print("There seems to be an error")
+        print(e)
@@ -0,0 +1,290 @@
+from datetime import datetime, date
+
+from sqlalchemy import (
+    select,
+    delete,
+    func,
+    case,
+    cast,
+    and_,
+    or_,
+    literal,
+    Date,
+    DateTime,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from sqlite import models
+from sqlite.enums import (
+    AttendanceEnum,
+    AttendanceAnalyticsDimensionEnum,
+    AttendanceAnalyticsBucketEnum,
+)
+from sqlite.schemas import AttendanceAnalyticsSearchClass, AttendanceAnalytics
+
+
+ATTENDANCE_ANALYTICS_DIMENSION_COLUMNS = {
+    AttendanceAnalyticsDimensionEnum.USER: (
+        models.AttendanceRollupModel.user_id
+    ),
+    AttendanceAnalyticsDimensionEnum.SCHEDULE: (
+        models.AttendanceRollupModel.schedule_id
+    ),
+    AttendanceAnalyticsDimensionEnum.TEACHER: (
+        models.AttendanceRollupModel.teacher_id
+    ),
+    AttendanceAnalyticsDimensionEnum.LOCATION: (
+        models.AttendanceRollupModel.location_id
+    ),
+}
+
+
+def get_attendance_rollups_source_query(
+    start_date: date, end_date: date, now: datetime
+):
+    """Aggregate the raw rows of [start_date, end_date] to the rollup grain.
+
+    Every student on an instance's roster is expected, the teacher is not.
+    A student with no attendance counts as absent once the instance ended.
+    """
+    schedule_instance_ids = select(models.ScheduleInstanceModel.id).where(
+        models.ScheduleInstanceModel.date.between(start_date, end_date)
+    )
+
+    # One status per student and instance, present wins over late
+    attendances = (
+        select(
+            models.AttendanceModel.schedule_instance_id,
+            models.AttendanceModel.user_id,
+            func.max(
+                case(
+                    (
+                        models.AttendanceModel.attendance_status
+                        == AttendanceEnum.PRESENT,
+                        2,
+                    ),
+                    else_=1,
+                )
+            ).label("status_rank"),
+        )
+        .where(
+            models.AttendanceModel.schedule_instance_id.in_(
+                schedule_instance_ids
+            )
+        )
+        .group_by(
+            models.AttendanceModel.schedule_instance_id,
+            models.AttendanceModel.user_id,
+        )
+        .subquery()
+    )
+
+    has_ended = or_(
+        models.ScheduleInstanceModel.date < now.date(),
+        and_(
+            models.ScheduleInstanceModel.date == now.date(),
+            models.ScheduleInstanceModel.end_time_in_utc
+            <= now.time().replace(tzinfo=None),
+        ),
+    )
+
+    return (
+        select(
+            models.ScheduleInstanceModel.date,
+            models.ScheduleInstanceModel.schedule_id,
+            models.ScheduleInstanceUserModel.user_id,
+            models.ScheduleInstanceModel.teacher_id,
+            models.ScheduleInstanceModel.location_id,
+            func.count().label("expected_count"),
+            func.count()
+            .filter(attendances.c.status_rank == 2)
+            .label("present_count"),
+            func.count()
+            .filter(attendances.c.status_rank == 1)
+            .label("late_count"),
+            func.count()
+            .filter(attendances.c.status_rank.is_(None), has_ended)
+            .label("absent_count"),
+            literal(now, DateTime(timezone=True)).label("refreshed_at_in_utc"),
+        )
+        .select_from(models.ScheduleInstanceUserModel)
+        .join(
+            models.ScheduleInstanceModel,
+            models.ScheduleInstanceModel.id
+            == models.ScheduleInstanceUserModel.schedule_instance_id,
+        )
+        .outerjoin(
+            attendances,
+            and_(
+                attendances.c.schedule_instance_id
+                == models.ScheduleInstanceUserModel.schedule_instance_id,
+                attendances.c.user_id
+                == models.ScheduleInstanceUserModel.user_id,
+            ),
+        )
+        .where(
+            models.ScheduleInstanceModel.date.between(start_date, end_date),
+            models.ScheduleInstanceUserModel.user_id
+            != models.ScheduleInstanceModel.teacher_id,
+        )
+        .group_by(
+            models.ScheduleInstanceModel.date,
+            models.ScheduleInstanceModel.schedule_id,
+            models.ScheduleInstanceUserModel.user_id,
+            models.ScheduleInstanceModel.teacher_id,
+            models.ScheduleInstanceModel.location_id,
+        )
+    )
+
+
+def get_attendance_rollups_delete_query(start_date: date, end_date: date):
+    return delete(models.AttendanceRollupModel).where(
+        models.AttendanceRollupModel.date.between(start_date, end_date)
+    )
+
+
+def get_attendance_rollups_insert_query(
+    start_date: date, end_date: date, now: datetime
+):
+    """INSERT ... SELECT the rollups of [start_date, end_date]"""
+    source_query = get_attendance_rollups_source_query(
+        start_date=start_date, end_date=end_date, now=now
+    )
+
+    return models.AttendanceRollupModel.__table__.insert().from_select(
+        [column.name for column in source_query.selected_columns],
+        source_query,
+    )
+
+
+def get_attendance_rollups_last_refreshed_at_query():
+    return select(func.max(models.AttendanceRollupModel.refreshed_at_in_utc))
+
+
+def get_attendance_dates_changed_since_query(since: datetime):
+    """Dates of the instances with attendances marked after since.
+
+    Deletions and roster changes leave no trace to find them by, see
+    rebuild_attendance_rollups.
+    """
+    return (
+        select(models.ScheduleInstanceModel.date)
+        .where(
+            models.ScheduleInstanceModel.id.in_(
+                select(models.AttendanceModel.schedule_instance_id).where(
+                    models.AttendanceModel.created_at_in_utc > since
+                )
+            )
+        )
+        .distinct()
+    )
+
+
+def get_date_bucket_expression(
+    column,
+    bucket: AttendanceAnalyticsBucketEnum,
+    dialect_name: str = "postgresql",
+):
+    """First day of the day / week (Monday) / month the column falls in"""
+    if bucket == AttendanceAnalyticsBucketEnum.DAY:
+        return column
+
+    if dialect_name == "sqlite":
+        if bucket == AttendanceAnalyticsBucketEnum.WEEK:
+            return func.date(column, "weekday 0", "-6 days")
+        return func.date(column, "start of month")
+
+    return cast(func.date_trunc(bucket.value, column), Date)
+
+
+def get_attendance_analytics_query(
+    search: AttendanceAnalyticsSearchClass,
+    dialect_name: str = "postgresql",
+):
+    """Sum the rollups of the range per bucket and grouped by dimensions"""
+    group_by_columns = [
+        ATTENDANCE_ANALYTICS_DIMENSION_COLUMNS[dimension]
+        for dimension in dict.fromkeys(search.group_by)
+    ]
+    if search.bucket:
+        group_by_columns.insert(
+            0,
+            get_date_bucket_expression(
+                column=models.AttendanceRollupModel.date,
+                bucket=search.bucket,
+                dialect_name=dialect_name,
+            ).label("bucket_start_date"),
+        )
+
+    filters = [
+        models.AttendanceRollupModel.date.between(
+            search.start_date, search.end_date
+        )
+    ]
+    for dimension, value in (
+        (AttendanceAnalyticsDimensionEnum.USER, search.user_id),
+        (AttendanceAnalyticsDimensionEnum.SCHEDULE, search.schedule_id),
+        (AttendanceAnalyticsDimensionEnum.TEACHER, search.teacher_id),
+        (AttendanceAnalyticsDimensionEnum.LOCATION, search.location_id),
+    ):
+        if value is not None:
+            filters.append(
+                ATTENDANCE_ANALYTICS_DIMENSION_COLUMNS[dimension] == value
+            )
+
+    return (
+        select(
+            *group_by_columns,
+            func.sum(models.AttendanceRollupModel.expected_count).label(
+                "expected_count"
+            ),
+            func.sum(models.AttendanceRollupModel.present_count).label(
+                "present_count"
+            ),
+            func.sum(models.AttendanceRollupModel.late_count).label(
+                "late_count"
+            ),
+            func.sum(models.AttendanceRollupModel.absent_count).label(
+                "absent_count"
+            ),
+        )
+        .where(*filters)
+        .group_by(*group_by_columns)
+        .order_by(*group_by_columns)
+    )
+
+
+async def get_attendance_analytics(
+    search: AttendanceAnalyticsSearchClass, db: AsyncSession
+) -> list[AttendanceAnalytics]:
+    result = await db.execute(
+        get_attendance_analytics_query(
+            search=search, dialect_name=db.get_bind().dialect.name
+        )
+    )
+
+    analytics = []
+    for row in result.mappings():
+        # SUM over no rows is NULL
+        counts = {
+            name: row[name] or 0
+            for name in (
+                "expected_count",
+                "present_count",
+                "late_count",
+                "absent_count",
+            )
+        }
+        attended_count = counts["present_count"] + counts["late_count"]
+        ended_count = attended_count + counts["absent_count"]
+
+        analytics.append(
+            AttendanceAnalytics(
+                **{**row, **counts},
+                attendance_rate=(
+                    attended_count / ended_count if ended_count else None
+                ),
+            )
+        )
+
+    return analytics
@@ -7,13 +7,21 @@ from sqlite import models
 from sqlite.enums import AttendanceEnum
 
 
+def get_attendance_by_schedule_instance_id_and_user_id_query(
+    schedule_instance_id: int, user_id: int
+):
+    return select(models.AttendanceModel).where(
+        models.AttendanceModel.schedule_instance_id == schedule_instance_id,
+        models.AttendanceModel.user_id == user_id,
+    )
+
+
 async def get_attendance_by_schedule_instance_id_and_user_id(
     schedule_instance_id: int, user_id: int, db: AsyncSession
 ):
     return await db.scalar(
-        select(models.AttendanceModel).where(
-            models.AttendanceModel.schedule_instance_id == schedule_instance_id,
-            models.AttendanceModel.user_id == user_id,
+        get_attendance_by_schedule_instance_id_and_user_id_query(
+            schedule_instance_id=schedule_instance_id, user_id=user_id
         )
     )
 
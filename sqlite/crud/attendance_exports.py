@@ -0,0 +1,246 @@
+import csv
+import io
+import time
+from datetime import date
+from typing import AsyncIterator
+
+import pyarrow
+import pyarrow.parquet
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from sqlite import models
+from sqlite.database import sessionmanager
+from sqlite.enums import AttendanceExportFormatEnum
+from utils import metrics
+from utils.date_utils import convert_datetime_to_iso_8601_with_z_suffix
+
+
+# Rows fetched from the server side cursor, and written, at a time
+ATTENDANCE_EXPORT_CHUNK_SIZE = 10000
+
+ATTENDANCE_EXPORT_SCHEMA = pyarrow.schema(
+    [
+        ("attendance_id", pyarrow.int64()),
+        ("user_id", pyarrow.int64()),
+        ("user_email", pyarrow.string()),
+        ("user_full_name", pyarrow.string()),
+        ("schedule_id", pyarrow.int64()),
+        ("schedule_title", pyarrow.string()),
+        ("schedule_instance_id", pyarrow.int64()),
+        ("date", pyarrow.date32()),
+        ("start_time_in_utc", pyarrow.time64("us")),
+        ("end_time_in_utc", pyarrow.time64("us")),
+        ("attendance_status", pyarrow.string()),
+        ("created_at_in_utc", pyarrow.timestamp("us", tz="UTC")),
+    ]
+)
+ATTENDANCE_EXPORT_MEDIA_TYPES = {
+    AttendanceExportFormatEnum.CSV: "text/csv",
+    AttendanceExportFormatEnum.PARQUET: "application/vnd.apache.parquet",
+}
+
+
+class ChunkSink(io.RawIOBase):
+    """A write-only file handing over what was written since the last drain.
+
+    Keeps counting the position, the Parquet footer points at offsets
+    from the start of the file.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        self._position += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def get_attendance_export_query(start_date: date, end_date: date):
+    """The attendances of the classes held between the dates, flattened.
+
+    Ordered like ix_schedule_instances_date_id and then
+    ix_attendances_schedule_instance_id_user_id, so the rows can come out
+    of a nested loop over both indexes without sorting the whole range.
+    """
+    return (
+        select(
+            models.AttendanceModel.id.label("attendance_id"),
+            models.AttendanceModel.user_id,
+            models.UserModel.email.label("user_email"),
+            models.UserModel.full_name.label("user_full_name"),
+            models.ScheduleInstanceModel.schedule_id,
+            models.ScheduleModel.title.label("schedule_title"),
+            models.AttendanceModel.schedule_instance_id,
+            models.ScheduleInstanceModel.date,
+            models.ScheduleInstanceModel.start_time_in_utc,
+            models.ScheduleInstanceModel.end_time_in_utc,
+            models.AttendanceModel.attendance_status,
+            models.AttendanceModel.created_at_in_utc,
+        )
+        .join(
+            models.ScheduleInstanceModel,
+            models.ScheduleInstanceModel.id
+            == models.AttendanceModel.schedule_instance_id,
+        )
+        .join(
+            models.ScheduleModel,
+            models.ScheduleModel.id
+            == models.ScheduleInstanceModel.schedule_id,
+        )
+        .join(
+            models.UserModel,
+            models.UserModel.id == models.AttendanceModel.user_id,
+        )
+        .where(
+            models.ScheduleInstanceModel.date >= start_date,
+            models.ScheduleInstanceModel.date <= end_date,
+        )
+        .order_by(
+            models.ScheduleInstanceModel.date,
+            models.ScheduleInstanceModel.id,
+            models.AttendanceModel.user_id,
+        )
+    )
+
+
+def get_csv_chunk(rows, is_first: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if is_first:
+        writer.writerow(ATTENDANCE_EXPORT_SCHEMA.names)
+
+    writer.writerows(
+        (
+            *row[:10],
+            row.attendance_status.value,
+            convert_datetime_to_iso_8601_with_z_suffix(row.created_at_in_utc),
+        )
+        for row in rows
+    )
+
+    return buffer.getvalue().encode()
+
+
+def get_parquet_table(rows) -> pyarrow.Table:
+    columns = [list(column) for column in zip(*rows)]
+    status_index = ATTENDANCE_EXPORT_SCHEMA.get_field_index(
+        "attendance_status"
+    )
+    columns[status_index] = [
+        attendance_status.value for attendance_status in columns[status_index]
+    ]
+
+    return pyarrow.Table.from_arrays(columns, schema=ATTENDANCE_EXPORT_SCHEMA)
+
+
+async def stream_attendance_export(
+    start_date: date,
+    end_date: date,
+    file_format: AttendanceExportFormatEnum,
+    db: AsyncSession,
+) -> AsyncIterator[bytes]:
+    """The export, chunk by chunk, in memory that does not grow with it.
+
+    Reads through a server side cursor ATTENDANCE_EXPORT_CHUNK_SIZE rows at
+    a time, a Parquet file gets a row group per chunk.
+    """
+    started_at = time.perf_counter()
+    rows_count = 0
+
+    result = await db.stream(
+        get_attendance_export_query(
+            start_date=start_date, end_date=end_date
+        ).execution_options(yield_per=ATTENDANCE_EXPORT_CHUNK_SIZE)
+    )
+
+    if file_format == AttendanceExportFormatEnum.CSV:
+        is_first = True
+        async for rows in result.partitions():
+            yield get_csv_chunk(rows=rows, is_first=is_first)
+            is_first = False
+            rows_count += len(rows)
+
+        # Still a valid file without any row
+        if is_first:
+            yield get_csv_chunk(rows=[], is_first=True)
+    else:
+        sink = ChunkSink()
+        writer = pyarrow.parquet.ParquetWriter(sink, ATTENDANCE_EXPORT_SCHEMA)
+        async for rows in result.partitions():
+            writer.write_table(get_parquet_table(rows=rows))
+            yield sink.drain()
+            rows_count += len(rows)
+
+        writer.close()
+        yield sink.drain()
+
+    metrics.increment_counter(
+        "attendance_export_rows_total",
+        rows_count,
+        labels={"format": file_format.value},
+    )
+    metrics.observe_histogram(
+        "attendance_export_seconds",
+        time.perf_counter() - started_at,
+        labels={"format": file_format.value},
+    )
+
+
+async def stream_attendance_export_in_own_session(
+    start_date: date,
+    end_date: date,
+    file_format: AttendanceExportFormatEnum,
+) -> AsyncIterator[bytes]:
+    # The response outlives the request's session on newer FastAPI versions
+    async with sessionmanager.session() as db:
+        async for chunk in stream_attendance_export(
+            start_date=start_date,
+            end_date=end_date,
+            file_format=file_format,
+            db=db,
+        ):
+            yield chunk
+
+
+def get_attendance_export_response(
+    start_date: date,
+    end_date: date,
+    file_format: AttendanceExportFormatEnum,
+) -> StreamingResponse:
+    """A chunked response streaming the attendances between the dates"""
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must not be before start_date",
+        )
+
+    filename = (
+        f"attendance_{start_date.isoformat()}_{end_date.isoformat()}"
+        f".{file_format.value}"
+    )
+
+    return StreamingResponse(
+        stream_attendance_export_in_own_session(
+            start_date=start_date,
+            end_date=end_date,
+            file_format=file_format,
+        ),
+        media_type=ATTENDANCE_EXPORT_MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -6,10 +6,10 @@ from sqlalchemy.orm import joinedload
 from sqlite import models
 
 
-async def get_all_attendance_tracking_by_schedule_instance_id(
-    schedule_instance_id: int, db: AsyncSession
+def get_all_attendance_tracking_by_schedule_instance_id_query(
+    schedule_instance_id: int,
 ):
-    result = await db.execute(
+    return (
         select(models.AttendanceTrackingModel)
         .options(
             joinedload(models.AttendanceTrackingModel.user),
@@ -21,6 +21,16 @@ async def get_all_attendance_tracking_by_schedule_instance_id(
         )
     )
 
+
+async def get_all_attendance_tracking_by_schedule_instance_id(
+    schedule_instance_id: int, db: AsyncSession
+):
+    result = await db.execute(
+        get_all_attendance_tracking_by_schedule_instance_id_query(
+            schedule_instance_id=schedule_instance_id
+        )
+    )
+
     return result.scalars().all()
 
 
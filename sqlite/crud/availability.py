@@ -0,0 +1,88 @@
+from datetime import date
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from sqlite.enums import AvailabilityResourceEnum
+from sqlite.schemas import (
+    Availability,
+    AvailabilityBlock,
+    AvailabilitySearchClass,
+)
+from sqlite.crud.schedules import (
+    build_schedule_interval_index,
+    get_schedule_interval_keys,
+    get_schedule_slots_by_date_query,
+)
+from utils import cache
+from utils.date_utils import return_day_of_week_name
+from utils.intervals import IntervalIndex, get_free_busy_blocks
+
+
+async def get_schedule_interval_index(
+    on_date: date, db: AsyncSession
+) -> IntervalIndex:
+    """Interval index of the schedules held on the date, cached in process.
+
+    Read the version before the schedules, so an index built while a write
+    commits is at worst filed under the version before it.
+    """
+    version = await cache.get_schedules_version()
+
+    index = cache.schedule_interval_index_cache.get((on_date, version))
+    if index is None:
+        result = await db.execute(
+            get_schedule_slots_by_date_query(date=on_date)
+        )
+        index = build_schedule_interval_index(rows=result.all())
+        cache.schedule_interval_index_cache.set((on_date, version), index)
+
+    return index
+
+
+async def get_availability(
+    availability: AvailabilitySearchClass, db: AsyncSession
+) -> list[Availability]:
+    """Free and busy blocks of every requested location and teacher within
+    the window, one cached index lookup each
+    """
+    index = await get_schedule_interval_index(on_date=availability.date, db=db)
+    day = return_day_of_week_name(date=availability.date)
+
+    resources = [
+        (AvailabilityResourceEnum.LOCATION, location_id)
+        for location_id in dict.fromkeys(availability.location_ids)
+    ] + [
+        (AvailabilityResourceEnum.TEACHER, teacher_id)
+        for teacher_id in dict.fromkeys(availability.teacher_ids)
+    ]
+
+    availabilities = []
+    for resource, resource_id in resources:
+        key = get_schedule_interval_keys(
+            teacher_id=resource_id, location_id=resource_id, day=day
+        )[resource.value]
+
+        blocks = [
+            AvailabilityBlock(
+                start_time_in_utc=start,
+                end_time_in_utc=end,
+                is_busy=bool(slots),
+                schedule_ids=[slot.schedule_id for slot in slots],
+            )
+            for start, end, slots in get_free_busy_blocks(
+                intervals=index.intervals(key=key),
+                start=availability.start_time_in_utc,
+                end=availability.end_time_in_utc,
+            )
+        ]
+
+        availabilities.append(
+            Availability(
+                resource=resource,
+                id=resource_id,
+                is_free=not any(block.is_busy for block in blocks),
+                blocks=blocks,
+            )
+        )
+
+    return availabilities
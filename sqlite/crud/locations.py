@@ -2,7 +2,9 @@ from sqlalchemy import select, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from sqlite import models
+from sqlite.enums import StatsCountersEnum
 from sqlite.schemas import LocationCreateOrUpdateClass
+from sqlite.crud.stats import increment_stats_counters
 
 
 def get_all_locations_query():
@@ -63,6 +65,10 @@ async def create_location(
 
     db.add(db_location)
 
+    await increment_stats_counters(
+        deltas={StatsCountersEnum.LOCATIONS_COUNT: 1}, db=db
+    )
+
     await db.commit()
 
     return db_location
@@ -83,4 +89,9 @@ async def update_location(
 
 async def delete_location(db_location: models.LocationModel, db: AsyncSession):
     await db.delete(db_location)
+
+    await increment_stats_counters(
+        deltas={StatsCountersEnum.LOCATIONS_COUNT: -1}, db=db
+    )
+
     await db.commit()
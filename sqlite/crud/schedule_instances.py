@@ -1,124 +1,424 @@
 from datetime import datetime, date, timezone
 
-from sqlalchemy import select, and_, or_
-from sqlalchemy.orm import joinedload
+from sqlalchemy import (
+    Select,
+    select,
+    delete,
+    exists,
+    literal,
+    true,
+    union,
+    and_,
+)
+from sqlalchemy.orm import joinedload, selectinload, load_only, raiseload
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from sqlite import models
-from sqlite.schemas import ScheduleInstanceUpdateClass
+from sqlite.database import get_insert_for_dialect
+from sqlite.schemas import (
+    ScheduleInstanceUpdateClass,
+    SCHEDULE_INSTANCE_SCHEMAS,
+)
+from sqlite.enums import StatsCountersEnum, ScheduleInstanceLoadProfileEnum
+from sqlite.crud.schedules import get_schedules_by_date_filter
+from sqlite.crud.stats import increment_stats_counters
 
+from utils import cache
 
-def get_all_schedule_instances_query():
-    return select(models.ScheduleInstanceModel).options(
-        joinedload(models.ScheduleInstanceModel.teacher).joinedload(
-            models.UserModel.additional_details
+
+def get_schedule_instance_load_options(
+    profile: ScheduleInstanceLoadProfileEnum,
+) -> list:
+    """Loader options that load what the profile's schema serializes.
+
+    The many-to-one relationships are lazy="joined" by default, so left
+    alone one instance row joins the teacher twice (its own and the
+    schedule's) plus both locations. DETAIL joins the instance's own
+    relationships and loads each distinct schedule once with a second
+    SELECT ... IN. LIST and MOBILE load a few columns of each and raise on
+    anything else instead of silently joining it.
+    """
+    if profile == ScheduleInstanceLoadProfileEnum.DETAIL:
+        return [
+            joinedload(models.ScheduleInstanceModel.teacher).joinedload(
+                models.UserModel.additional_details
+            ),
+            joinedload(models.ScheduleInstanceModel.location),
+            selectinload(models.ScheduleInstanceModel.schedule).options(
+                joinedload(models.ScheduleModel.teacher).joinedload(
+                    models.UserModel.additional_details
+                ),
+                joinedload(models.ScheduleModel.location),
+            ),
+        ]
+
+    location_options = (
+        [joinedload(models.ScheduleInstanceModel.location)]
+        if profile == ScheduleInstanceLoadProfileEnum.LIST
+        else [
+            joinedload(models.ScheduleInstanceModel.location).load_only(
+                models.LocationModel.title,
+                models.LocationModel.bluetooth_address,
+                models.LocationModel.coordinates,
+            )
+        ]
+    )
+
+    return [
+        load_only(
+            models.ScheduleInstanceModel.date,
+            models.ScheduleInstanceModel.start_time_in_utc,
+            models.ScheduleInstanceModel.end_time_in_utc,
+        ),
+        joinedload(models.ScheduleInstanceModel.teacher).options(
+            load_only(models.UserModel.full_name), raiseload("*")
         ),
-        joinedload(models.ScheduleInstanceModel.schedule)
-        .joinedload(models.ScheduleModel.teacher)
-        .joinedload(models.UserModel.additional_details),
+        joinedload(models.ScheduleInstanceModel.schedule).options(
+            load_only(
+                models.ScheduleModel.title,
+                models.ScheduleModel.is_reoccurring,
+            ),
+            raiseload("*"),
+        ),
+        *location_options,
+        raiseload("*"),
+    ]
+
+
+def get_all_schedule_instances_query(
+    profile: ScheduleInstanceLoadProfileEnum = (
+        ScheduleInstanceLoadProfileEnum.DETAIL
+    ),
+):
+    return select(models.ScheduleInstanceModel).options(
+        *get_schedule_instance_load_options(profile=profile)
     )
 
 
-def get_all_schedule_instances_by_date_query(date: date):
+def get_all_schedule_instances_by_date_query(
+    date: date,
+    profile: ScheduleInstanceLoadProfileEnum = (
+        ScheduleInstanceLoadProfileEnum.DETAIL
+    ),
+):
     return (
         select(models.ScheduleInstanceModel)
-        .options(
-            joinedload(models.ScheduleInstanceModel.teacher).joinedload(
-                models.UserModel.additional_details
-            ),
-            joinedload(models.ScheduleInstanceModel.schedule)
-            .joinedload(models.ScheduleModel.teacher)
-            .joinedload(models.UserModel.additional_details),
-        )
+        .options(*get_schedule_instance_load_options(profile=profile))
         .where(models.ScheduleInstanceModel.date == date)
     )
 
 
+def get_schedule_instance_ids_by_user_id_query(
+    user_id: int, start_date: date, end_date: date
+):
+    """Ids of the instances the user attends or teaches.
+
+    Semi-joins on the bridge table, whose primary key leads with user_id,
+    instead of an EXISTS through users, so the cost follows the user's own
+    classes. The teacher branch catches instances moved to another teacher.
+    """
+    return union(
+        select(models.ScheduleInstanceUserModel.schedule_instance_id).where(
+            models.ScheduleInstanceUserModel.user_id == user_id
+        ),
+        select(models.ScheduleInstanceModel.id).where(
+            models.ScheduleInstanceModel.date >= start_date,
+            models.ScheduleInstanceModel.date <= end_date,
+            models.ScheduleInstanceModel.teacher_id == user_id,
+        ),
+    )
+
+
 def get_all_schedule_instance_by_date_range_and_user_id_query(
-    start_date: date, end_date: date, user_id: int, db: AsyncSession
+    start_date: date,
+    end_date: date,
+    user_id: int,
+    db: AsyncSession,
+    profile: ScheduleInstanceLoadProfileEnum = (
+        ScheduleInstanceLoadProfileEnum.DETAIL
+    ),
 ):
     return (
         select(models.ScheduleInstanceModel)
-        .options(
-            joinedload(models.ScheduleInstanceModel.teacher).joinedload(
-                models.UserModel.additional_details
-            ),
-            joinedload(models.ScheduleInstanceModel.schedule)
-            .joinedload(models.ScheduleModel.teacher)
-            .joinedload(models.UserModel.additional_details),
-        )
+        .options(*get_schedule_instance_load_options(profile=profile))
         .where(
             and_(
                 models.ScheduleInstanceModel.date >= start_date,
                 models.ScheduleInstanceModel.date <= end_date,
-                or_(
-                    models.ScheduleInstanceModel.academic_users.any(
-                        models.UserModel.id == user_id
-                    ),
-                    models.ScheduleInstanceModel.teacher_id == user_id,
+                models.ScheduleInstanceModel.id.in_(
+                    get_schedule_instance_ids_by_user_id_query(
+                        user_id=user_id,
+                        start_date=start_date,
+                        end_date=end_date,
+                    )
                 ),
             )
         )
     )
 
 
-def get_today_schedule_instances_query():
+def get_today_schedule_instances_query(
+    profile: ScheduleInstanceLoadProfileEnum = (
+        ScheduleInstanceLoadProfileEnum.DETAIL
+    ),
+):
     now = datetime.now(tz=timezone.utc)
 
     return (
         select(models.ScheduleInstanceModel)
-        .options(
-            joinedload(models.ScheduleInstanceModel.teacher).joinedload(
-                models.UserModel.additional_details
-            ),
-            joinedload(models.ScheduleInstanceModel.schedule)
-            .joinedload(models.ScheduleModel.teacher)
-            .joinedload(models.UserModel.additional_details),
-        )
+        .options(*get_schedule_instance_load_options(profile=profile))
         .where(models.ScheduleInstanceModel.date == now.date())
     )
 
 
-def get_today_schedule_instances_by_user_id_query(user_id: int):
+def get_today_schedule_instances_by_user_id_query(
+    user_id: int,
+    profile: ScheduleInstanceLoadProfileEnum = (
+        ScheduleInstanceLoadProfileEnum.DETAIL
+    ),
+):
 
     now = datetime.now(tz=timezone.utc)
 
     return (
         select(models.ScheduleInstanceModel)
-        .options(
-            joinedload(models.ScheduleInstanceModel.teacher).joinedload(
-                models.UserModel.additional_details
-            ),
-            joinedload(models.ScheduleInstanceModel.schedule)
-            .joinedload(models.ScheduleModel.teacher)
-            .joinedload(models.UserModel.additional_details),
-        )
+        .options(*get_schedule_instance_load_options(profile=profile))
         .where(
             and_(
                 models.ScheduleInstanceModel.date == now.date(),
-                or_(
-                    models.ScheduleInstanceModel.academic_users.any(
-                        models.UserModel.id == user_id
-                    ),
-                    models.ScheduleInstanceModel.teacher_id == user_id,
+                models.ScheduleInstanceModel.id.in_(
+                    get_schedule_instance_ids_by_user_id_query(
+                        user_id=user_id,
+                        start_date=now.date(),
+                        end_date=now.date(),
+                    )
                 ),
             )
         )
     )
 
 
+async def get_today_schedule_instances_by_user_id(
+    user_id: int,
+    db: AsyncSession,
+    profile: ScheduleInstanceLoadProfileEnum = (
+        ScheduleInstanceLoadProfileEnum.DETAIL
+    ),
+) -> list[dict]:
+    """Serialized get_today_schedule_instances_by_user_id_query, read-through
+    cached in Redis per user and date. Writes to today's instances
+    invalidate the users they touch, see utils.cache.
+    """
+    today = datetime.now(tz=timezone.utc).date()
+
+    cached, generation = await cache.get_cached_today_schedule_instances(
+        user_id=user_id, on_date=today, profile=profile
+    )
+    if cached is not None:
+        return cached
+
+    result = await db.scalars(
+        get_today_schedule_instances_by_user_id_query(
+            user_id=user_id, profile=profile
+        )
+    )
+    schema = SCHEDULE_INSTANCE_SCHEMAS[profile]
+    schedule_instances = [
+        schema.model_validate(db_schedule_instance).model_dump(mode="json")
+        for db_schedule_instance in result.unique().all()
+    ]
+
+    if generation is not None:
+        await cache.set_cached_today_schedule_instances(
+            user_id=user_id,
+            on_date=today,
+            profile=profile,
+            generation=generation,
+            value=schedule_instances,
+        )
+
+    return schedule_instances
+
+
+def get_schedule_instance_user_ids_by_date_query(
+    schedule_instance_ids: list[int] | Select,
+):
+    """(date, user_id) of the roster and the teacher of every instance"""
+    return union(
+        select(
+            models.ScheduleInstanceModel.date,
+            models.ScheduleInstanceUserModel.user_id,
+        )
+        .join(
+            models.ScheduleInstanceModel,
+            models.ScheduleInstanceModel.id
+            == models.ScheduleInstanceUserModel.schedule_instance_id,
+        )
+        .where(
+            models.ScheduleInstanceUserModel.schedule_instance_id.in_(
+                schedule_instance_ids
+            )
+        ),
+        select(
+            models.ScheduleInstanceModel.date,
+            models.ScheduleInstanceModel.teacher_id,
+        ).where(models.ScheduleInstanceModel.id.in_(schedule_instance_ids)),
+    )
+
+
+def group_user_ids_by_date(rows) -> dict[date, set[int]]:
+    user_ids_by_date = {}
+    for on_date, user_id in rows:
+        user_ids_by_date.setdefault(on_date, set()).add(user_id)
+
+    return user_ids_by_date
+
+
+def get_missing_schedule_instances_insert_query(
+    date: date,
+    now: datetime,
+    dialect_name: str = "postgresql",
+    schedule_filter=None,
+):
+    """INSERT ... SELECT every schedule due on date that has no instance yet
+
+    The NOT EXISTS keeps the steady state from burning sequence values, the
+    ON CONFLICT on the natural key makes concurrent runs safe.
+    """
+    return (
+        get_insert_for_dialect(dialect_name=dialect_name)(
+            models.ScheduleInstanceModel
+        )
+        .from_select(
+            [
+                models.ScheduleInstanceModel.schedule_id,
+                models.ScheduleInstanceModel.teacher_id,
+                models.ScheduleInstanceModel.location_id,
+                models.ScheduleInstanceModel.date,
+                models.ScheduleInstanceModel.start_time_in_utc,
+                models.ScheduleInstanceModel.end_time_in_utc,
+                models.ScheduleInstanceModel.created_at_in_utc,
+            ],
+            select(
+                models.ScheduleModel.id,
+                models.ScheduleModel.teacher_id,
+                models.ScheduleModel.location_id,
+                literal(date),
+                models.ScheduleModel.start_time_in_utc,
+                models.ScheduleModel.end_time_in_utc,
+                literal(now),
+            ).where(
+                get_schedules_by_date_filter(date=date),
+                schedule_filter if schedule_filter is not None else true(),
+                ~exists().where(
+                    models.ScheduleInstanceModel.schedule_id
+                    == models.ScheduleModel.id,
+                    models.ScheduleInstanceModel.date == date,
+                    models.ScheduleInstanceModel.start_time_in_utc
+                    == models.ScheduleModel.start_time_in_utc,
+                    models.ScheduleInstanceModel.end_time_in_utc
+                    == models.ScheduleModel.end_time_in_utc,
+                ),
+            ),
+        )
+        .on_conflict_do_nothing(
+            index_elements=[
+                models.ScheduleInstanceModel.schedule_id,
+                models.ScheduleInstanceModel.date,
+                models.ScheduleInstanceModel.start_time_in_utc,
+                models.ScheduleInstanceModel.end_time_in_utc,
+            ]
+        )
+        .returning(models.ScheduleInstanceModel.id)
+    )
+
+
+def get_schedule_instance_users_insert_query(
+    schedule_instance_ids: list[int], dialect_name: str = "postgresql"
+):
+    """INSERT ... SELECT the schedule roster into each given instance"""
+    return (
+        get_insert_for_dialect(dialect_name=dialect_name)(
+            models.ScheduleInstanceUserModel
+        )
+        .from_select(
+            [
+                models.ScheduleInstanceUserModel.user_id,
+                models.ScheduleInstanceUserModel.schedule_instance_id,
+            ],
+            select(
+                models.ScheduleUserModel.user_id,
+                models.ScheduleInstanceModel.id,
+            )
+            .join(
+                models.ScheduleInstanceModel,
+                models.ScheduleInstanceModel.schedule_id
+                == models.ScheduleUserModel.schedule_id,
+            )
+            .where(models.ScheduleInstanceModel.id.in_(schedule_instance_ids))
+            .distinct(),
+        )
+        .on_conflict_do_nothing()
+    )
+
+
+def get_schedule_roster_sync_insert_query(
+    schedule_id: int, from_date: date, dialect_name: str = "postgresql"
+):
+    """INSERT the schedule users missing from its instances since from_date"""
+    return (
+        get_insert_for_dialect(dialect_name=dialect_name)(
+            models.ScheduleInstanceUserModel
+        )
+        .from_select(
+            [
+                models.ScheduleInstanceUserModel.user_id,
+                models.ScheduleInstanceUserModel.schedule_instance_id,
+            ],
+            select(
+                models.ScheduleUserModel.user_id,
+                models.ScheduleInstanceModel.id,
+            )
+            .join(
+                models.ScheduleInstanceModel,
+                models.ScheduleInstanceModel.schedule_id
+                == models.ScheduleUserModel.schedule_id,
+            )
+            .where(
+                models.ScheduleUserModel.schedule_id == schedule_id,
+                models.ScheduleInstanceModel.date >= from_date,
+            ),
+        )
+        .on_conflict_do_nothing()
+    )
+
+
+def get_schedule_roster_sync_delete_query(schedule_id: int, from_date: date):
+    """DELETE the instance users no longer on the schedule since from_date"""
+    return delete(models.ScheduleInstanceUserModel).where(
+        models.ScheduleInstanceUserModel.schedule_instance_id.in_(
+            select(models.ScheduleInstanceModel.id).where(
+                models.ScheduleInstanceModel.schedule_id == schedule_id,
+                models.ScheduleInstanceModel.date >= from_date,
+            )
+        ),
+        models.ScheduleInstanceUserModel.user_id.not_in(
+            select(models.ScheduleUserModel.user_id).where(
+                models.ScheduleUserModel.schedule_id == schedule_id
+            )
+        ),
+    )
+
+
 async def get_schedule_instance_by_id(
     schedule_instance_id: int, db: AsyncSession
 ):
     return await db.scalar(
         select(models.ScheduleInstanceModel)
         .options(
-            joinedload(models.ScheduleInstanceModel.teacher).joinedload(
-                models.UserModel.additional_details
-            ),
-            joinedload(models.ScheduleInstanceModel.schedule)
-            .joinedload(models.ScheduleModel.teacher)
-            .joinedload(models.UserModel.additional_details),
+            *get_schedule_instance_load_options(
+                profile=ScheduleInstanceLoadProfileEnum.DETAIL
+            )
         )
         .where(models.ScheduleInstanceModel.id == schedule_instance_id)
     )
@@ -129,20 +429,50 @@ async def update_schedule_instance(
     db_schedule_instance: models.ScheduleInstanceModel,
     db: AsyncSession,
 ):
+    # The roster and the teacher, the teacher is about to change
+    result = await db.execute(
+        get_schedule_instance_user_ids_by_date_query(
+            schedule_instance_ids=[db_schedule_instance.id]
+        )
+    )
+    user_ids_by_date = group_user_ids_by_date(rows=result.all())
+
     db_schedule_instance.update(schedule_instance=schedule_instance)
+    user_ids_by_date.setdefault(db_schedule_instance.date, set()).add(
+        db_schedule_instance.teacher_id
+    )
 
     await db.commit()
 
+    await cache.invalidate_today_schedule_instances(
+        user_ids_by_date=user_ids_by_date
+    )
+
     return db_schedule_instance
 
 
 async def delete_schedule_instance(
     db_schedule_instance: models.ScheduleInstanceModel, db: AsyncSession
 ):
+    result = await db.execute(
+        get_schedule_instance_user_ids_by_date_query(
+            schedule_instance_ids=[db_schedule_instance.id]
+        )
+    )
+    user_ids_by_date = group_user_ids_by_date(rows=result.all())
+
     await db.delete(db_schedule_instance)
 
+    await increment_stats_counters(
+        deltas={StatsCountersEnum.SCHEDULE_INSTANCES_COUNT: -1}, db=db
+    )
+
     await db.commit()
 
+    await cache.invalidate_today_schedule_instances(
+        user_ids_by_date=user_ids_by_date
+    )
+
     return {"detail": "Deleted successfully"}
 
 
@@ -1,10 +1,14 @@
-from datetime import datetime, date, timezone
+import asyncio
+from dataclasses import dataclass
 
-from sqlalchemy import select, delete, or_, and_
+from datetime import datetime, date, time, timezone
+
+from sqlalchemy import select, insert, delete, func, union, or_, and_
 from sqlalchemy.orm import joinedload
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from sqlite import models
+from sqlite.database import get_insert_for_dialect
 from sqlite.schemas import (
     ScheduleReoccurringCreateClass,
     ScheduleNonReoccurringCreateClass,
@@ -14,9 +18,15 @@ from sqlite.schemas import (
     ScheduleReoccurringSearchClass,
     ScheduleNonReoccurringSearchClass,
 )
-from sqlite.enums import DaysEnum
+from sqlite.enums import DaysEnum, StatsCountersEnum
+from sqlite.crud.stats import increment_stats_counters
+
+from utils import cache
 
 from utils.date_utils import return_day_of_week_name
+from utils.intervals import IntervalIndex
+
+from celery_app import publish_schedule_changed, publish_schedules_changed
 
 
 def get_all_schedules_query():
@@ -51,6 +61,23 @@ def get_all_schedules_by_day_query(day: DaysEnum):
     )
 
 
+def get_schedules_by_date_filter(date: date):
+    day = return_day_of_week_name(date=date)
+
+    return or_(
+        and_(
+            models.ScheduleModel.is_reoccurring.is_(True),
+            models.ScheduleModel.date.is_(None),
+            models.ScheduleModel.day == day,
+        ),
+        and_(
+            models.ScheduleModel.is_reoccurring.is_(False),
+            models.ScheduleModel.date == date,
+            models.ScheduleModel.day == day,
+        ),
+    )
+
+
 def get_today_schedules_query():
     now = datetime.now(tz=timezone.utc)
 
@@ -61,22 +88,7 @@ def get_today_schedules_query():
                 models.UserModel.additional_details
             ),
         )
-        .where(
-            or_(
-                and_(
-                    models.ScheduleModel.is_reoccurring.is_(True),
-                    models.ScheduleModel.date.is_(None),
-                    models.ScheduleModel.day
-                    == return_day_of_week_name(date=now),
-                ),
-                and_(
-                    ~models.ScheduleModel.is_reoccurring.is_(False),
-                    models.ScheduleModel.date == now.date(),
-                    models.ScheduleModel.day
-                    == return_day_of_week_name(date=now),
-                ),
-            )
-        )
+        .where(get_schedules_by_date_filter(date=now.date()))
     )
 
 
@@ -89,16 +101,120 @@ def get_all_schedules_by_user_id_query(user_id: int):
             ),
         )
         .where(
-            or_(
-                models.ScheduleModel.academic_users.any(
-                    models.UserModel.id == user_id
-                ),
-                models.ScheduleModel.teacher_id == user_id,
+            models.ScheduleModel.id.in_(
+                # Semi-join on the bridge table, see schedule_instances
+                union(
+                    select(models.ScheduleUserModel.schedule_id).where(
+                        models.ScheduleUserModel.user_id == user_id
+                    ),
+                    select(models.ScheduleModel.id).where(
+                        models.ScheduleModel.teacher_id == user_id
+                    ),
+                )
             )
         )
     )
 
 
+@dataclass(frozen=True)
+class ScheduleSlot:
+    # None until created, e.g. for the rows of a timetable import
+    schedule_id: int | None
+    # None for a reoccurring schedule
+    date: date | None
+    start_time_in_utc: time
+    end_time_in_utc: time
+    # Position in a timetable import
+    row: int | None = None
+
+    def __str__(self) -> str:
+        name = (
+            f"schedule {self.schedule_id}"
+            if self.schedule_id is not None
+            else f"row {self.row}"
+        )
+        return (
+            f"{name} ({self.start_time_in_utc.isoformat()}"
+            f"-{self.end_time_in_utc.isoformat()})"
+        )
+
+
+def get_schedule_slot_columns() -> tuple:
+    return (
+        models.ScheduleModel.id,
+        models.ScheduleModel.teacher_id,
+        models.ScheduleModel.location_id,
+        models.ScheduleModel.day,
+        models.ScheduleModel.date,
+        models.ScheduleModel.start_time_in_utc,
+        models.ScheduleModel.end_time_in_utc,
+    )
+
+
+def get_schedule_slots_query(from_date: date):
+    """The slot of every reoccurring schedule and of the one-off ones from
+    from_date on, the ones that can still clash with a new schedule
+    """
+    return select(*get_schedule_slot_columns()).where(
+        or_(
+            models.ScheduleModel.is_reoccurring.is_(True),
+            models.ScheduleModel.date >= from_date,
+        )
+    )
+
+
+def get_schedule_slots_by_date_query(date: date):
+    return select(*get_schedule_slot_columns()).where(
+        get_schedules_by_date_filter(date=date)
+    )
+
+
+def get_schedule_interval_keys(
+    teacher_id: int, location_id: int, day: DaysEnum
+) -> dict[str, tuple]:
+    """Keys of a schedule's slot in the interval index, by what it books"""
+    return {
+        "teacher": ("teacher", teacher_id, day),
+        "location": ("location", location_id, day),
+    }
+
+
+def are_schedule_dates_overlapping(
+    first_date: date | None, second_date: date | None
+) -> bool:
+    # A reoccurring schedule meets every one-off schedule on its day
+    return (
+        first_date is None or second_date is None or first_date == second_date
+    )
+
+
+def build_schedule_interval_index(rows) -> IntervalIndex:
+    """Index the rows of get_schedule_slots_query by teacher / location and
+    day, see are_schedule_dates_overlapping for the dates
+    """
+    index = IntervalIndex()
+    for row in rows:
+        slot = ScheduleSlot(
+            schedule_id=row.id,
+            date=row.date,
+            start_time_in_utc=row.start_time_in_utc,
+            end_time_in_utc=row.end_time_in_utc,
+        )
+        for key in get_schedule_interval_keys(
+            teacher_id=row.teacher_id,
+            location_id=row.location_id,
+            day=row.day,
+        ).values():
+            index.add(
+                key=key,
+                start=row.start_time_in_utc,
+                end=row.end_time_in_utc,
+                value=slot,
+            )
+
+    return index
+
+
 async def get_reoccurring_schedule(
     schedule: ScheduleReoccurringSearchClass, db: AsyncSession
 ):
@@ -159,76 +275,251 @@ async def get_schedule_by_id(schedule_id: int, db: AsyncSession):
     )
 
 
-async def create_schedule(
+def get_schedule_model(
     schedule: (
         ScheduleReoccurringCreateClass | ScheduleNonReoccurringCreateClass
     ),
-    db: AsyncSession,
-):
-    students = schedule.students
-    del schedule.students
+) -> models.ScheduleModel:
+    values = schedule.model_dump(exclude={"students"})
 
     if isinstance(schedule, ScheduleReoccurringCreateClass):
-        db_schedule = models.ScheduleModel(
-            **schedule.__dict__, is_reoccurring=True, date=None
+        return models.ScheduleModel(**values, is_reoccurring=True, date=None)
+    return models.ScheduleModel(
+        **values,
+        is_reoccurring=False,
+        day=return_day_of_week_name(date=schedule.date),
+    )
+
+
+async def create_schedules(
+    schedules: list[
+        ScheduleReoccurringCreateClass | ScheduleNonReoccurringCreateClass
+    ],
+    db: AsyncSession,
+) -> list[models.ScheduleModel]:
+    """Create the schedules and their rosters in one transaction.
+
+    The schedules go in with one INSERT ... RETURNING and their users, the
+    teacher plus the valid students, with one bulk INSERT. The teachers and
+    locations are loaded up front and the schedules detached before the
+    commit, so they come back serializable without being reloaded.
+    """
+    if not schedules:
+        return []
+
+    teachers = {
+        teacher.id: teacher
+        for teacher in (
+            await db.scalars(
+                select(models.UserModel)
+                .where(
+                    models.UserModel.id.in_(
+                        {schedule.teacher_id for schedule in schedules}
+                    )
+                )
+                .options(joinedload(models.UserModel.additional_details))
+            )
+        ).unique()
+    }
+    locations = {
+        location.id: location
+        for location in await db.scalars(
+            select(models.LocationModel).where(
+                models.LocationModel.id.in_(
+                    {schedule.location_id for schedule in schedules}
+                )
+            )
         )
-    else:
-        db_schedule = models.ScheduleModel(
-            **schedule.__dict__,
-            is_reoccurring=False,
-            day=return_day_of_week_name(date=schedule.date),
+    }
+
+    db_schedules = []
+    for schedule in schedules:
+        db_schedule = get_schedule_model(schedule=schedule)
+        # Assigning None would null the ids, leave unknown ones to the FKs
+        if schedule.teacher_id in teachers:
+            db_schedule.teacher = teachers[schedule.teacher_id]
+        if schedule.location_id in locations:
+            db_schedule.location = locations[schedule.location_id]
+        db_schedules.append(db_schedule)
+
+    db.add_all(db_schedules)
+    await db.flush()
+
+    student_ids = set().union(*(schedule.students for schedule in schedules))
+    valid_student_ids = (
+        set(
+            await db.scalars(
+                select(models.UserModel.id).where(
+                    models.UserModel.id.in_(student_ids),
+                    models.UserModel.is_admin.is_(False),
+                    models.UserModel.is_student.is_(True),
+                )
+            )
         )
+        if student_ids
+        else set()
+    )
 
-    db.add(db_schedule)
+    schedule_users = set()
+    for schedule, db_schedule in zip(schedules, db_schedules):
+        schedule_users.add((db_schedule.teacher_id, db_schedule.id))
+        schedule_users.update(
+            (student_id, db_schedule.id)
+            for student_id in schedule.students
+            if student_id in valid_student_ids
+        )
+    await db.execute(
+        insert(models.ScheduleUserModel),
+        [
+            {"user_id": user_id, "schedule_id": schedule_id}
+            for user_id, schedule_id in schedule_users
+        ],
+    )
+
+    await increment_stats_counters(
+        deltas={StatsCountersEnum.SCHEDULES_COUNT: len(db_schedules)}, db=db
+    )
+
+    schedule_ids = [db_schedule.id for db_schedule in db_schedules]
+    # The commit would expire them, the teachers' additional details go
+    # with the teachers
+    for instance in {
+        id(instance): instance
+        for db_schedule in db_schedules
+        for instance in (
+            db_schedule,
+            db_schedule.teacher,
+            db_schedule.location,
+        )
+        if instance is not None
+    }.values():
+        db.expunge(instance)
 
     await db.commit()
-    await db.refresh(db_schedule)
 
-    # Add teacher id as user_id in ScheduleUser Model
-    db.add(
-        models.ScheduleUserModel(
-            user_id=db_schedule.teacher_id,
-            schedule_id=db_schedule.id,
+    await cache.invalidate_schedule_interval_indexes()
+
+    # Materialize / reconcile the instances without waiting for the beat
+    await asyncio.to_thread(publish_schedules_changed, schedule_ids)
+
+    return db_schedules
+
+
+async def create_schedule(
+    schedule: (
+        ScheduleReoccurringCreateClass | ScheduleNonReoccurringCreateClass
+    ),
+    db: AsyncSession,
+):
+    db_schedules = await create_schedules(schedules=[schedule], db=db)
+
+    return db_schedules[0]
+
+
+def get_schedule_instance_users_remove_query(
+    schedule_id: int, user_ids: set[int], from_date: date
+):
+    """DELETE the given users from the schedule's instances since from_date"""
+    return delete(models.ScheduleInstanceUserModel).where(
+        models.ScheduleInstanceUserModel.user_id.in_(user_ids),
+        models.ScheduleInstanceUserModel.schedule_instance_id.in_(
+            select(models.ScheduleInstanceModel.id).where(
+                models.ScheduleInstanceModel.schedule_id == schedule_id,
+                models.ScheduleInstanceModel.date >= from_date,
+            )
+        ),
+    )
+
+
+def get_schedule_instance_users_add_query(
+    schedule_id: int,
+    user_ids: set[int],
+    from_date: date,
+    dialect_name: str = "postgresql",
+):
+    """INSERT the given schedule users into its instances since from_date"""
+    return (
+        get_insert_for_dialect(dialect_name=dialect_name)(
+            models.ScheduleInstanceUserModel
         )
+        .from_select(
+            [
+                models.ScheduleInstanceUserModel.user_id,
+                models.ScheduleInstanceUserModel.schedule_instance_id,
+            ],
+            select(
+                models.ScheduleUserModel.user_id,
+                models.ScheduleInstanceModel.id,
+            )
+            .join(
+                models.ScheduleInstanceModel,
+                models.ScheduleInstanceModel.schedule_id
+                == models.ScheduleUserModel.schedule_id,
+            )
+            .where(
+                models.ScheduleUserModel.schedule_id == schedule_id,
+                models.ScheduleUserModel.user_id.in_(user_ids),
+                models.ScheduleInstanceModel.date >= from_date,
+            ),
+        )
+        .on_conflict_do_nothing()
     )
-    await db.commit()
-    await db.refresh(db_schedule)
 
-    # Add all students to the bridge table
+
+async def update_schedule_roster(
+    db_schedule: models.ScheduleModel, students: list[int], db: AsyncSession
+) -> tuple[set[int], set[int]]:
+    """Make the schedule users its teacher plus the given students.
+
+    Computed as a set diff, only the added and removed rows are written.
+    Ids that are not students are ignored. Does not commit, returns the
+    added and the removed user ids.
+    """
+    user_ids = {db_schedule.teacher_id}
     if students:
-        user_result = await db.execute(
-            select(models.UserModel).where(
-                models.UserModel.id.in_(students),
-                models.UserModel.is_admin.is_(False),
-                models.UserModel.is_student.is_(True),
+        user_ids.update(
+            await db.scalars(
+                select(models.UserModel.id).where(
+                    models.UserModel.id.in_(students),
+                    models.UserModel.is_admin.is_(False),
+                    models.UserModel.is_student.is_(True),
+                )
             )
         )
-        student_objs = user_result.scalars().all()
 
-        for student in student_objs:
-            db.add(
-                models.ScheduleUserModel(
-                    user_id=student.id,
-                    schedule_id=db_schedule.id,
-                )
+    current_user_ids = set(
+        await db.scalars(
+            select(models.ScheduleUserModel.user_id).where(
+                models.ScheduleUserModel.schedule_id == db_schedule.id
             )
+        )
+    )
 
-        await db.commit()
-        await db.refresh(db_schedule)
+    added_user_ids = user_ids - current_user_ids
+    removed_user_ids = current_user_ids - user_ids
 
-    # Eagerly load nested relationships
-    result = await db.execute(
-        select(models.ScheduleModel)
-        .options(
-            joinedload(models.ScheduleModel.teacher).joinedload(
-                models.UserModel.additional_details
-            ),
+    if removed_user_ids:
+        await db.execute(
+            delete(models.ScheduleUserModel).where(
+                models.ScheduleUserModel.schedule_id == db_schedule.id,
+                models.ScheduleUserModel.user_id.in_(removed_user_ids),
+            )
+        )
+    if added_user_ids:
+        await db.execute(
+            get_insert_for_dialect(dialect_name=db.get_bind().dialect.name)(
+                models.ScheduleUserModel
+            )
+            .values(
+                [
+                    {"user_id": user_id, "schedule_id": db_schedule.id}
+                    for user_id in added_user_ids
+                ]
+            )
+            .on_conflict_do_nothing()
         )
-        .where(models.ScheduleModel.id == db_schedule.id)
-    )
-    db_schedule = result.scalar_one()
 
-    return db_schedule
+    return added_user_ids, removed_user_ids
 
 
 async def update_schedule(
@@ -248,58 +539,101 @@ async def update_schedule(
             schedule=schedule, day=return_day_of_week_name(date=schedule.date)
         )
 
-    await db.commit()
-    await db.refresh(db_schedule)
-
-    # 1. Remove all existing students
-    await db.scalars(
-        delete(models.ScheduleUserModel).where(
-            models.ScheduleUserModel.schedule_id == db_schedule.id
-        )
+    added_user_ids, removed_user_ids = await update_schedule_roster(
+        db_schedule=db_schedule, students=students, db=db
     )
 
-    # 2. Add new students
-    if students:
-        user_result = await db.execute(
-            select(models.UserModel).where(
-                models.UserModel.id.in_(students),
-                models.UserModel.is_admin.is_(False),
-                models.UserModel.is_student.is_(True),
+    schedule_id = db_schedule.id
+    # Same cut-off as the roster sync of reconcile_schedule_instances, which
+    # then has nothing left to do for the roster
+    today = datetime.now(tz=timezone.utc).date()
+    if removed_user_ids:
+        await db.execute(
+            get_schedule_instance_users_remove_query(
+                schedule_id=schedule_id,
+                user_ids=removed_user_ids,
+                from_date=today,
             )
         )
-        student_objs = user_result.scalars().all()
-
-        for student in student_objs:
-            db.add(
-                models.ScheduleUserModel(
-                    user_id=student.id,
-                    schedule_id=db_schedule.id,
-                )
+    if added_user_ids:
+        await db.execute(
+            get_schedule_instance_users_add_query(
+                schedule_id=schedule_id,
+                user_ids=added_user_ids,
+                from_date=today,
+                dialect_name=db.get_bind().dialect.name,
             )
+        )
 
     await db.commit()
-    await db.refresh(db_schedule)
 
-    # Eagerly load nested relationships
-    result = await db.execute(
-        select(models.ScheduleModel)
-        .options(
-            joinedload(models.ScheduleModel.teacher).joinedload(
-                models.UserModel.additional_details
-            ),
+    await cache.invalidate_schedule_interval_indexes()
+
+    # The worker only sees the roster after this commit, so it can not tell
+    # who left today's classes
+    if added_user_ids or removed_user_ids:
+        await cache.invalidate_today_schedule_instances(
+            user_ids_by_date={today: added_user_ids | removed_user_ids}
         )
-        .where(models.ScheduleModel.id == db_schedule.id)
-    )
-    db_schedule = result.scalar_one()
+
+    # Eagerly load nested relationships
+    db_schedule = await get_schedule_by_id(schedule_id=schedule_id, db=db)
+
+    # Materialize / reconcile the instances without waiting for the beat
+    await asyncio.to_thread(publish_schedule_changed, schedule_id)
 
     return db_schedule
 
 
 async def delete_schedule(db_schedule: models.ScheduleModel, db: AsyncSession):
+    # sqlite.crud.schedule_instances imports this module
+    from sqlite.crud.schedule_instances import (
+        get_schedule_instance_user_ids_by_date_query,
+        group_user_ids_by_date,
+    )
+
+    # Who has one of today's instances, they are gone after the delete
+    today = datetime.now(tz=timezone.utc).date()
+    result = await db.execute(
+        get_schedule_instance_user_ids_by_date_query(
+            schedule_instance_ids=select(
+                models.ScheduleInstanceModel.id
+            ).where(
+                models.ScheduleInstanceModel.schedule_id == db_schedule.id,
+                models.ScheduleInstanceModel.date == today,
+            )
+        )
+    )
+    user_ids_by_date = group_user_ids_by_date(rows=result.all())
+
+    # Its instances go with it through the ON DELETE CASCADE
+    schedule_instances_count = await db.scalar(
+        select(func.count())
+        .select_from(models.ScheduleInstanceModel)
+        .where(models.ScheduleInstanceModel.schedule_id == db_schedule.id)
+    )
+
     await db.delete(db_schedule)
 
+    await increment_stats_counters(
+        deltas={
+            StatsCountersEnum.SCHEDULES_COUNT: -1,
+            StatsCountersEnum.SCHEDULE_INSTANCES_COUNT: (
+                -schedule_instances_count
+            ),
+        },
+        db=db,
+    )
+
     await db.commit()
 
+    await cache.invalidate_schedule_interval_indexes()
+
+    if user_ids_by_date:
+        await cache.invalidate_today_schedule_instances(
+            user_ids_by_date=user_ids_by_date
+        )
+
     return {"detail": "Deleted successfully"}
 
 
@@ -1,44 +1,164 @@
-from sqlalchemy import select, func
+from datetime import datetime, timezone
+
+from sqlalchemy import select, update, func, case, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from sqlite import models
-from sqlite.schemas import StatsBaseClass
+from sqlite.database import get_insert_for_dialect
+from sqlite.enums import StatsCountersEnum
+from sqlite.schemas import Stats
 
 
-async def get_all_stats(db: AsyncSession):
-    teachers_count = await db.scalar(
-        select(func.count())
-        .select_from(models.UserModel)
-        .where(
+def get_all_stats_query():
+    """All the dashboard counts in a single round trip and one users scan"""
+    users_counts = select(
+        func.count()
+        .filter(
             models.UserModel.is_admin.is_(False),
             models.UserModel.is_student.is_(False),
         )
-    )
-    students_count = await db.scalar(
-        select(func.count())
-        .select_from(models.UserModel)
-        .where(
+        .label(StatsCountersEnum.TEACHERS_COUNT.value),
+        func.count()
+        .filter(
             models.UserModel.is_admin.is_(False),
             models.UserModel.is_student.is_(True),
         )
+        .label(StatsCountersEnum.STUDENTS_COUNT.value),
+    ).subquery()
+
+    return select(
+        users_counts.c[StatsCountersEnum.TEACHERS_COUNT.value],
+        users_counts.c[StatsCountersEnum.STUDENTS_COUNT.value],
+        select(func.count())
+        .select_from(models.LocationModel)
+        .scalar_subquery()
+        .label(StatsCountersEnum.LOCATIONS_COUNT.value),
+        select(func.count())
+        .select_from(models.ScheduleModel)
+        .scalar_subquery()
+        .label(StatsCountersEnum.SCHEDULES_COUNT.value),
+        select(func.count())
+        .select_from(models.ScheduleInstanceModel)
+        .scalar_subquery()
+        .label(StatsCountersEnum.SCHEDULE_INSTANCES_COUNT.value),
+    )
+
+
+def get_stats_counters_increment_query(
+    deltas: dict[StatsCountersEnum, int],
+):
+    """UPDATE several counters by their delta in a single statement"""
+    return (
+        update(models.StatsCounterModel)
+        .where(models.StatsCounterModel.name.in_(deltas.keys()))
+        .values(
+            value=models.StatsCounterModel.value
+            + case(
+                *(
+                    (models.StatsCounterModel.name == name, delta)
+                    for name, delta in deltas.items()
+                ),
+                else_=0,
+            ),
+            updated_at_in_utc=datetime.now(tz=timezone.utc),
+        )
     )
 
-    location_count = await db.scalar(
-        select(func.count()).select_from(models.LocationModel)
+
+def get_stats_counters_lock_query():
+    """Hold off the increments, not the reads, until the recount commits.
+
+    Taken before counting, so no increment can commit between the count
+    and the refresh upsert and be overwritten by it. Postgres only, SQLite
+    writers are serialized anyway.
+    """
+    return text(
+        f"LOCK TABLE {models.StatsCounterModel.__tablename__} "
+        "IN SHARE ROW EXCLUSIVE MODE"
     )
-    schedules_count = await db.scalar(
-        select(func.count()).select_from(models.ScheduleModel)
+
+
+def get_stats_counters_refresh_query(
+    counts: dict[StatsCountersEnum, int],
+    now: datetime,
+    dialect_name: str = "postgresql",
+):
+    """UPSERT every counter with an exact count, see the lock query"""
+    insert_query = get_insert_for_dialect(dialect_name=dialect_name)(
+        models.StatsCounterModel
+    ).values(
+        [
+            {
+                "name": name,
+                "value": value,
+                "refreshed_at_in_utc": now,
+                "updated_at_in_utc": now,
+            }
+            for name, value in counts.items()
+        ]
     )
-    schedule_instances_count = await db.scalar(
-        select(func.count()).select_from(models.ScheduleInstanceModel)
+
+    return insert_query.on_conflict_do_update(
+        index_elements=[models.StatsCounterModel.name],
+        set_={
+            "value": insert_query.excluded.value,
+            "refreshed_at_in_utc": insert_query.excluded.refreshed_at_in_utc,
+            "updated_at_in_utc": insert_query.excluded.updated_at_in_utc,
+        },
     )
 
-    return StatsBaseClass(
-        teachers_count=teachers_count if teachers_count else 0,
-        students_count=students_count if students_count else 0,
-        locations_count=location_count if location_count else 0,
-        schedules_count=schedules_count if schedules_count else 0,
-        schedule_instances_count=(
-            schedule_instances_count if schedule_instances_count else 0
-        ),
+
+def get_user_stats_counter(
+    is_admin: bool, is_student: bool
+) -> StatsCountersEnum | None:
+    if is_admin:
+        return None
+    if is_student:
+        return StatsCountersEnum.STUDENTS_COUNT
+    return StatsCountersEnum.TEACHERS_COUNT
+
+
+async def increment_stats_counters(
+    deltas: dict[StatsCountersEnum, int], db: AsyncSession
+):
+    """Apply the deltas in the caller's transaction, does not commit"""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if deltas:
+        await db.execute(get_stats_counters_increment_query(deltas=deltas))
+
+
+async def get_all_stats(db: AsyncSession, use_counters: bool = False):
+    if use_counters:
+        result = await db.execute(select(models.StatsCounterModel))
+        db_counters = result.scalars().all()
+
+        # Until the first recount has run, fall back to counting
+        if len(db_counters) == len(StatsCountersEnum):
+            return Stats(
+                **{
+                    db_counter.name.value: max(db_counter.value, 0)
+                    for db_counter in db_counters
+                },
+                is_cached=True,
+                refreshed_at_in_utc=min(
+                    db_counter.refreshed_at_in_utc
+                    for db_counter in db_counters
+                ),
+                updated_at_in_utc=max(
+                    db_counter.updated_at_in_utc for db_counter in db_counters
+                ),
+            )
+
+    result = await db.execute(get_all_stats_query())
+    row = result.one()
+
+    now = datetime.now(tz=timezone.utc)
+
+    return Stats(
+        **{
+            name: value if value else 0 for name, value in row._mapping.items()
+        },
+        is_cached=False,
+        refreshed_at_in_utc=now,
+        updated_at_in_utc=now,
     )
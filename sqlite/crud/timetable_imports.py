@@ -0,0 +1,165 @@
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from sqlite import models
+from sqlite.schemas import (
+    ScheduleReoccurringCreateClass,
+    ScheduleNonReoccurringCreateClass,
+    TimetableImportReport,
+    TimetableImportRowError,
+)
+from sqlite.crud.schedules import (
+    ScheduleSlot,
+    are_schedule_dates_overlapping,
+    build_schedule_interval_index,
+    create_schedules,
+    get_schedule_interval_keys,
+    get_schedule_slots_query,
+)
+from utils import metrics
+from utils.date_utils import return_day_of_week_name
+
+
+# Schedules created and committed together, see create_schedules
+TIMETABLE_IMPORT_BATCH_SIZE = 500
+
+
+async def import_timetable(
+    schedules: list[
+        ScheduleReoccurringCreateClass | ScheduleNonReoccurringCreateClass
+    ],
+    db: AsyncSession,
+    batch_size: int = TIMETABLE_IMPORT_BATCH_SIZE,
+) -> TimetableImportReport:
+    """Create a timetable, skipping the schedules that double book.
+
+    Every schedule is checked in memory against an interval index of the
+    existing ones and of the rows accepted before it, per teacher and per
+    location and day. A reoccurring schedule clashes with the one-off ones
+    on its day. The accepted rows are then created batch by batch, every
+    batch commits on its own.
+
+    Not guarded against schedules created concurrently, run one import at
+    a time.
+    """
+    started_at = time.perf_counter()
+    today = datetime.now(tz=timezone.utc).date()
+
+    result = await db.execute(get_schedule_slots_query(from_date=today))
+    index = build_schedule_interval_index(rows=result.all())
+
+    teacher_ids = set(
+        await db.scalars(
+            select(models.UserModel.id).where(
+                models.UserModel.id.in_(
+                    {schedule.teacher_id for schedule in schedules}
+                ),
+                models.UserModel.is_admin.is_(False),
+                models.UserModel.is_student.is_(False),
+            )
+        )
+    )
+    location_ids = set(
+        await db.scalars(
+            select(models.LocationModel.id).where(
+                models.LocationModel.id.in_(
+                    {schedule.location_id for schedule in schedules}
+                )
+            )
+        )
+    )
+
+    errors = []
+    accepted_schedules = []
+    for row, schedule in enumerate(schedules, start=1):
+        row_errors = []
+        if schedule.teacher_id not in teacher_ids:
+            row_errors.append("teacher_id: not a teacher")
+        if schedule.location_id not in location_ids:
+            row_errors.append("location_id: not found")
+        # The defaults are the current time, meaningless for a timetable
+        for field in ("start_time_in_utc", "end_time_in_utc"):
+            if field not in schedule.model_fields_set:
+                row_errors.append(f"{field}: required for an import")
+        if not row_errors and (
+            schedule.end_time_in_utc <= schedule.start_time_in_utc
+        ):
+            row_errors.append(
+                "end_time_in_utc: must be after start_time_in_utc"
+            )
+
+        if row_errors:
+            errors.append(TimetableImportRowError(row=row, errors=row_errors))
+            continue
+
+        if isinstance(schedule, ScheduleReoccurringCreateClass):
+            day = schedule.day
+            on_date = None
+        else:
+            day = return_day_of_week_name(date=schedule.date)
+            on_date = schedule.date
+
+        keys = get_schedule_interval_keys(
+            teacher_id=schedule.teacher_id,
+            location_id=schedule.location_id,
+            day=day,
+        )
+        for name, key in keys.items():
+            row_errors.extend(
+                f"{name}: double booked with {slot}"
+                for slot in index.overlapping(
+                    key=key,
+                    start=schedule.start_time_in_utc,
+                    end=schedule.end_time_in_utc,
+                )
+                if are_schedule_dates_overlapping(
+                    first_date=on_date, second_date=slot.date
+                )
+            )
+
+        if row_errors:
+            errors.append(TimetableImportRowError(row=row, errors=row_errors))
+            continue
+
+        slot = ScheduleSlot(
+            schedule_id=None,
+            date=on_date,
+            start_time_in_utc=schedule.start_time_in_utc,
+            end_time_in_utc=schedule.end_time_in_utc,
+            row=row,
+        )
+        for key in keys.values():
+            index.add(
+                key=key,
+                start=schedule.start_time_in_utc,
+                end=schedule.end_time_in_utc,
+                value=slot,
+            )
+        accepted_schedules.append(schedule)
+
+    check_seconds = time.perf_counter() - started_at
+
+    created_count = 0
+    for i in range(0, len(accepted_schedules), batch_size):
+        db_schedules = await create_schedules(
+            schedules=accepted_schedules[i : i + batch_size], db=db
+        )
+        created_count += len(db_schedules)
+
+    elapsed_seconds = time.perf_counter() - started_at
+    metrics.increment_counter("timetable_import_rows_total", len(schedules))
+    metrics.increment_counter("timetable_import_created_total", created_count)
+    metrics.observe_histogram("timetable_import_seconds", elapsed_seconds)
+
+    return TimetableImportReport(
+        total_rows=len(schedules),
+        created_count=created_count,
+        failed_count=len(errors),
+        errors=errors,
+        elapsed_seconds=round(elapsed_seconds, 3),
+        check_seconds=round(check_seconds, 3),
+        insert_seconds=round(elapsed_seconds - check_seconds, 3),
+    )
@@ -0,0 +1,414 @@
+import codecs
+import csv
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from sqlite import models
+from sqlite.database import get_insert_for_dialect
+from sqlite.enums import UserImportFormatEnum
+from sqlite.schemas import (
+    UserAdditionalDetailCreateOrUpdateClass,
+    UserCreateClass,
+    UserImportReport,
+    UserImportRowError,
+)
+from sqlite.crud.stats import increment_stats_counters, get_user_stats_counter
+from utils import metrics
+from utils.password import get_password_hashes_async
+
+
+# Rows hashed, inserted and committed together, keep it under the bind
+# parameter limits: 6 per user row, 4 per additional detail row
+USER_IMPORT_BATCH_SIZE = 1000
+# Bytes read from the upload at a time
+USER_IMPORT_CHUNK_SIZE = 64 * 1024
+# Times a batch is retried when a concurrent write takes one of its emails
+# or phones between the duplicate check and the insert
+USER_IMPORT_BATCH_ATTEMPTS = 2
+
+
+@dataclass
+class UserImportRow:
+    row: int
+    user: UserCreateClass
+    additional_details: UserAdditionalDetailCreateOrUpdateClass
+    hashed_password: str | None = None
+
+
+async def read_upload_lines(
+    file, chunk_size: int = USER_IMPORT_CHUNK_SIZE
+) -> AsyncIterator[str]:
+    """Lines of an UploadFile, without reading the whole file in memory"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    while chunk := await file.read(chunk_size):
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def parse_user_import_lines(
+    lines: AsyncIterator[str], file_format: UserImportFormatEnum
+) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    """(row, values, error) per non blank line.
+
+    One user per line, so quoted CSV values can not span lines. Empty CSV
+    values are left out, the schema defaults apply to them.
+    """
+    header = None
+    row = 0
+    async for line in lines:
+        line = line.rstrip("\r")
+        if not line.strip():
+            continue
+
+        if file_format == UserImportFormatEnum.CSV and header is None:
+            header = [column.strip() for column in next(csv.reader([line]))]
+            continue
+
+        row += 1
+        if file_format == UserImportFormatEnum.CSV:
+            values = next(csv.reader([line]))
+            if len(values) != len(header):
+                yield row, None, (
+                    f"expected {len(header)} columns, got {len(values)}"
+                )
+                continue
+
+            yield row, {
+                column: value
+                for column, value in zip(header, values)
+                if value != ""
+            }, None
+        else:
+            try:
+                values = json.loads(line)
+            except ValueError as e:
+                yield row, None, f"invalid JSON: {e}"
+                continue
+
+            if not isinstance(values, dict):
+                yield row, None, "must be a JSON object"
+                continue
+
+            yield row, values, None
+
+
+def get_validation_errors(e: ValidationError) -> list[str]:
+    return [
+        ".".join(str(loc) for loc in error["loc"]) + ": " + error["msg"]
+        for error in e.errors()
+    ]
+
+
+def validate_user_import_row(
+    row: int, values: dict
+) -> tuple[UserImportRow | None, list[str]]:
+    """The columns of UserCreateClass, plus the additional details ones"""
+    errors = []
+    try:
+        user = UserCreateClass.model_validate(values)
+    except ValidationError as e:
+        user = None
+        errors.extend(get_validation_errors(e))
+    try:
+        additional_details = (
+            UserAdditionalDetailCreateOrUpdateClass.model_validate(values)
+        )
+    except ValidationError as e:
+        additional_details = None
+        errors.extend(get_validation_errors(e))
+
+    if errors:
+        return None, errors
+
+    if user.is_admin and user.is_student:
+        errors.append("Can not be admin and student at the same time")
+    # Admins have no additional details, see create_user
+    if user.is_admin and any(additional_details.model_dump().values()):
+        errors.append("Admins can not have additional details")
+
+    if errors:
+        return None, errors
+
+    return (
+        UserImportRow(
+            row=row, user=user, additional_details=additional_details
+        ),
+        [],
+    )
+
+
+async def insert_user_import_batch(
+    batch: list[UserImportRow], timings: dict, db: AsyncSession
+) -> tuple[int, list[UserImportRowError]]:
+    """Create the rows whose email and phone are free, in one transaction.
+
+    Returns the created count and the rejected rows, raises IntegrityError
+    when a concurrent write took a phone after the check.
+    """
+    existing_emails = set(
+        await db.scalars(
+            select(models.UserModel.email).where(
+                models.UserModel.email.in_(
+                    [import_row.user.email for import_row in batch]
+                )
+            )
+        )
+    )
+    phones = [
+        import_row.additional_details.phone
+        for import_row in batch
+        if import_row.additional_details.phone is not None
+    ]
+    existing_phones = (
+        set(
+            await db.scalars(
+                select(models.UserAdditionalDetailModel.phone).where(
+                    models.UserAdditionalDetailModel.phone.in_(phones)
+                )
+            )
+        )
+        if phones
+        else set()
+    )
+
+    errors = []
+    import_rows = []
+    for import_row in batch:
+        row_errors = []
+        if import_row.user.email in existing_emails:
+            row_errors.append("email: already exists")
+        if import_row.additional_details.phone in existing_phones:
+            row_errors.append("phone: already exists")
+
+        if row_errors:
+            errors.append(
+                UserImportRowError(
+                    row=import_row.row,
+                    email=import_row.user.email,
+                    errors=row_errors,
+                )
+            )
+        else:
+            import_rows.append(import_row)
+
+    if not import_rows:
+        return 0, errors
+
+    # Rows already hashed by a failed attempt keep their hash
+    unhashed_rows = [
+        import_row
+        for import_row in import_rows
+        if import_row.hashed_password is None
+    ]
+    if unhashed_rows:
+        started_at = time.perf_counter()
+        hashed_passwords = await get_password_hashes_async(
+            passwords=[
+                import_row.user.password for import_row in unhashed_rows
+            ]
+        )
+        for import_row, hashed_password in zip(
+            unhashed_rows, hashed_passwords
+        ):
+            import_row.hashed_password = hashed_password
+        timings["hashing_seconds"] += time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    insert = get_insert_for_dialect(dialect_name=db.get_bind().dialect.name)
+    now = datetime.now(tz=timezone.utc)
+
+    # A concurrent create_user can still take an email, skip those rows
+    result = await db.execute(
+        insert(models.UserModel)
+        .values(
+            [
+                {
+                    "full_name": import_row.user.full_name,
+                    "email": import_row.user.email,
+                    "password": import_row.hashed_password,
+                    "is_admin": import_row.user.is_admin,
+                    "is_student": import_row.user.is_student,
+                    "created_at_in_utc": now,
+                }
+                for import_row in import_rows
+            ]
+        )
+        .on_conflict_do_nothing(index_elements=[models.UserModel.email])
+        .returning(models.UserModel.email, models.UserModel.id)
+    )
+    user_ids = dict(result.all())
+
+    created_rows = []
+    for import_row in import_rows:
+        if import_row.user.email in user_ids:
+            created_rows.append(import_row)
+        else:
+            errors.append(
+                UserImportRowError(
+                    row=import_row.row,
+                    email=import_row.user.email,
+                    errors=["email: already exists"],
+                )
+            )
+
+    additional_details = [
+        {
+            "user_id": user_ids[import_row.user.email],
+            **import_row.additional_details.model_dump(),
+        }
+        for import_row in created_rows
+        if not import_row.user.is_admin
+    ]
+    if additional_details:
+        await db.execute(
+            insert(models.UserAdditionalDetailModel).values(additional_details)
+        )
+
+    deltas = {}
+    for import_row in created_rows:
+        stats_counter = get_user_stats_counter(
+            is_admin=import_row.user.is_admin,
+            is_student=import_row.user.is_student,
+        )
+        if stats_counter:
+            deltas[stats_counter] = deltas.get(stats_counter, 0) + 1
+    await increment_stats_counters(deltas=deltas, db=db)
+
+    await db.commit()
+    timings["insert_seconds"] += time.perf_counter() - started_at
+
+    return len(created_rows), errors
+
+
+async def import_batch(
+    batch: list[UserImportRow], timings: dict, db: AsyncSession
+) -> tuple[int, list[UserImportRowError]]:
+    for _ in range(USER_IMPORT_BATCH_ATTEMPTS):
+        try:
+            return await insert_user_import_batch(
+                batch=batch, timings=timings, db=db
+            )
+        except IntegrityError as e:
+            await db.rollback()
+            print("There seems to be an error")
+            print(e)
+
+    return 0, [
+        UserImportRowError(
+            row=import_row.row,
+            email=import_row.user.email,
+            errors=["conflicts with a concurrent write, import it again"],
+        )
+        for import_row in batch
+    ]
+
+
+async def import_users(
+    lines: AsyncIterator[str],
+    file_format: UserImportFormatEnum,
+    db: AsyncSession,
+    batch_size: int = USER_IMPORT_BATCH_SIZE,
+) -> UserImportReport:
+    """Create the users of a CSV or JSONL stream, see read_upload_lines.
+
+    Rows that fail validation or whose email or phone is taken, earlier in
+    the file or in the database, are reported and skipped. Every batch
+    commits on its own, so a failure keeps the batches before it.
+    """
+    started_at = time.perf_counter()
+    timings = {"hashing_seconds": 0.0, "insert_seconds": 0.0}
+
+    total_rows = 0
+    created_count = 0
+    errors = []
+    seen_emails = set()
+    seen_phones = set()
+    batch = []
+
+    async for row, values, error in parse_user_import_lines(
+        lines=lines, file_format=file_format
+    ):
+        total_rows += 1
+        if error is not None:
+            errors.append(UserImportRowError(row=row, errors=[error]))
+            continue
+
+        import_row, row_errors = validate_user_import_row(
+            row=row, values=values
+        )
+        if import_row is None:
+            email = values.get("email")
+            errors.append(
+                UserImportRowError(
+                    row=row,
+                    email=email if isinstance(email, str) else None,
+                    errors=row_errors,
+                )
+            )
+            continue
+
+        phone = import_row.additional_details.phone
+        if import_row.user.email in seen_emails:
+            row_errors.append("email: already earlier in the file")
+        if phone is not None and phone in seen_phones:
+            row_errors.append("phone: already earlier in the file")
+        if row_errors:
+            errors.append(
+                UserImportRowError(
+                    row=row, email=import_row.user.email, errors=row_errors
+                )
+            )
+            continue
+
+        seen_emails.add(import_row.user.email)
+        if phone is not None:
+            seen_phones.add(phone)
+
+        batch.append(import_row)
+        if len(batch) >= batch_size:
+            batch_created_count, batch_errors = await import_batch(
+                batch=batch, timings=timings, db=db
+            )
+            created_count += batch_created_count
+            errors.extend(batch_errors)
+            batch = []
+
+    if batch:
+        batch_created_count, batch_errors = await import_batch(
+            batch=batch, timings=timings, db=db
+        )
+        created_count += batch_created_count
+        errors.extend(batch_errors)
+
+    elapsed_seconds = time.perf_counter() - started_at
+    metrics.increment_counter("user_import_rows_total", total_rows)
+    metrics.increment_counter("user_import_created_total", created_count)
+    metrics.observe_histogram("user_import_seconds", elapsed_seconds)
+
+    return UserImportReport(
+        total_rows=total_rows,
+        created_count=created_count,
+        failed_count=len(errors),
+        errors=sorted(errors, key=lambda error: error.row),
+        elapsed_seconds=round(elapsed_seconds, 3),
+        hashing_seconds=round(timings["hashing_seconds"], 3),
+        insert_seconds=round(timings["insert_seconds"], 3),
+        rows_per_second=round(
+            total_rows / elapsed_seconds if elapsed_seconds else 0.0, 1
+        ),
+    )
@@ -10,7 +10,9 @@ from sqlite.schemas import (
     UserUpdateClass,
     UserPasswordUpdateClass,
 )
-from utils.password import get_password_hash
+from sqlite.crud.stats import increment_stats_counters, get_user_stats_counter
+from utils import cache
+from utils.password import get_password_hash_async
 
 
 def get_all_admin_users_query():
@@ -58,7 +60,7 @@ async def get_user_by_phone(user_phone: str, db: AsyncSession):
 
 
 async def create_user(user: UserCreateClass, db: AsyncSession):
-    user.password = get_password_hash(user.password)
+    user.password = await get_password_hash_async(password=user.password)
 
     db_user = models.UserModel(**user.__dict__)
 
@@ -70,12 +72,23 @@ async def create_user(user: UserCreateClass, db: AsyncSession):
         )
     db.add(db_user)
 
+    stats_counter = get_user_stats_counter(
+        is_admin=user.is_admin, is_student=user.is_student
+    )
+    if stats_counter:
+        await increment_stats_counters(deltas={stats_counter: 1}, db=db)
+
     await db.commit()
 
 
 async def update_user(
     user: UserUpdateClass, db_user: models.UserModel, db: AsyncSession
 ):
+    old_stats_counter = get_user_stats_counter(
+        is_admin=db_user.is_admin, is_student=db_user.is_student
+    )
+    old_email = db_user.email
+
     db_user.update(user)
 
     if db_user.additional_details:
@@ -86,24 +99,52 @@ async def update_user(
     #  updated_at_in_utc will not trigger
     db_user.updated_at_in_utc = datetime.now(tz=timezone.utc)
 
+    new_stats_counter = get_user_stats_counter(
+        is_admin=db_user.is_admin, is_student=db_user.is_student
+    )
+    if old_stats_counter != new_stats_counter:
+        deltas = {}
+        if old_stats_counter:
+            deltas[old_stats_counter] = -1
+        if new_stats_counter:
+            deltas[new_stats_counter] = 1
+        await increment_stats_counters(deltas=deltas, db=db)
+
     await db.commit()
 
+    await cache.invalidate_current_user(
+        emails=list(dict.fromkeys([old_email, user.email]))
+    )
+
 
 async def update_user_password(
     new_password: UserPasswordUpdateClass,
     db_user: models.UserModel,
     db: AsyncSession,
 ):
-    new_password.new_password = get_password_hash(
+    new_password.new_password = await get_password_hash_async(
         password=new_password.new_password
     )
     db_user.update_password(new_password=new_password.new_password)
+    email = db_user.email
 
     await db.commit()
 
+    await cache.invalidate_current_user(emails=[email])
+
 
 async def delete_user(db_user: models.UserModel, db: AsyncSession):
+    stats_counter = get_user_stats_counter(
+        is_admin=db_user.is_admin, is_student=db_user.is_student
+    )
+    email = db_user.email
+
     await db.delete(db_user)
     # UserAssociationDetails is on cascade, it will be deleted automatically
 
+    if stats_counter:
+        await increment_stats_counters(deltas={stats_counter: -1}, db=db)
+
     await db.commit()
+
+    await cache.invalidate_current_user(emails=[email])
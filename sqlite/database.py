@@ -1,24 +1,112 @@
 import contextlib
+import time
 from typing import Any, AsyncIterator
 
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.asyncio import (
     AsyncConnection,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import DeclarativeBase
 
 from secret import secret
 
+from utils import metrics
+
+from sqlite.instrumentation import instrument_engine
+
 
 class Base(DeclarativeBase):
     pass
 
 
+def get_insert_for_dialect(dialect_name: str):
+    """Return the dialect specific insert, needed for ON CONFLICT clauses"""
+    if dialect_name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long a checkout waited for a connection"""
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe_histogram(
+                "db_pool_checkout_wait_seconds",
+                time.perf_counter() - started_at,
+                labels={"engine": self.logging_name or "default"},
+            )
+
+
+def instrument_pool(engine: Engine, name: str) -> None:
+    """Export connection and checkout counts and pool occupancy as metrics"""
+    labels = {"engine": name}
+
+    def set_pool_gauges(returning: int = 0):
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            metrics.set_gauge("db_pool_size", pool.size(), labels=labels)
+            metrics.set_gauge(
+                "db_pool_checked_out",
+                pool.checkedout() - returning,
+                labels=labels,
+            )
+            metrics.set_gauge(
+                "db_pool_overflow", max(pool.overflow(), 0), labels=labels
+            )
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.increment_counter("db_pool_connects_total", labels=labels)
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.increment_counter("db_pool_checkouts_total", labels=labels)
+        set_pool_gauges()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        # Fired before the connection is back in the queue
+        set_pool_gauges(returning=1)
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.increment_counter("db_pool_invalidations_total", labels=labels)
+
+
+def create_sync_engine(name: str = "sync") -> Engine:
+    """Create the pooled, tuned sync engine used by the Celery worker"""
+    engine = create_engine(
+        secret.SYNC_DATABASE_URL,
+        poolclass=TimedQueuePool,
+        pool_size=secret.SYNC_DATABASE_POOL_SIZE,
+        max_overflow=secret.SYNC_DATABASE_MAX_OVERFLOW,
+        pool_recycle=secret.SYNC_DATABASE_POOL_RECYCLE_IN_SECONDS,
+        pool_timeout=secret.SYNC_DATABASE_POOL_TIMEOUT_IN_SECONDS,
+        # Drop connections that went stale, e.g. after a Postgres restart
+        pool_pre_ping=secret.SYNC_DATABASE_POOL_PRE_PING,
+        pool_logging_name=name,
+    )
+    instrument_pool(engine=engine, name=name)
+    if secret.DB_INSTRUMENTATION:
+        instrument_engine(engine=engine, name=name)
+
+    return engine
+
+
 class DatabaseSessionManager:
     def __init__(self, host: str, engine_kwargs: dict[str, Any] = {}):
         self._engine = create_async_engine(host, **engine_kwargs)
+        if secret.DB_INSTRUMENTATION:
+            instrument_engine(engine=self._engine.sync_engine, name="async")
         self._sessionmaker = async_sessionmaker(
             autocommit=False, bind=self._engine
         )
@@ -33,3 +33,51 @@ class DaysEnum(str, enum.Enum):
 class AttendanceEnum(str, enum.Enum):
     PRESENT = "present"
     LATE = "late"
+
+
+class StatsCountersEnum(str, enum.Enum):
+    TEACHERS_COUNT = "teachers_count"
+    STUDENTS_COUNT = "students_count"
+    LOCATIONS_COUNT = "locations_count"
+    SCHEDULES_COUNT = "schedules_count"
+    SCHEDULE_INSTANCES_COUNT = "schedule_instances_count"
+
+
+class AttendanceAnalyticsDimensionEnum(str, enum.Enum):
+    USER = "user"
+    SCHEDULE = "schedule"
+    TEACHER = "teacher"
+    LOCATION = "location"
+
+
+class AttendanceAnalyticsBucketEnum(str, enum.Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+class ScheduleInstanceLoadProfileEnum(str, enum.Enum):
+    # ScheduleInstance, everything nested
+    DETAIL = "detail"
+    # ScheduleInstanceListItem
+    LIST = "list"
+    # ScheduleInstanceMobile
+    MOBILE = "mobile"
+
+
+class UserImportFormatEnum(str, enum.Enum):
+    # Header line, then one user per line
+    CSV = "csv"
+    # One JSON object per line
+    JSONL = "jsonl"
+
+
+class AvailabilityResourceEnum(str, enum.Enum):
+    LOCATION = "location"
+    TEACHER = "teacher"
+
+
+class AttendanceExportFormatEnum(str, enum.Enum):
+    CSV = "csv"
+    # Columnar, one row group per fetched chunk
+    PARQUET = "parquet"
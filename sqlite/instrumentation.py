@@ -0,0 +1,171 @@
+import contextlib
+import contextvars
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from sqlalchemy import Engine, event
+
+from secret import secret
+
+from utils import metrics
+
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+@dataclass
+class QueryScope:
+    kind: str
+    name: str
+    queries: int = 0
+    seconds: float = 0.0
+    statements: dict[str, int] = field(default_factory=dict)
+
+
+_current_scope: contextvars.ContextVar[QueryScope | None] = (
+    contextvars.ContextVar("query_scope", default=None)
+)
+
+_whitespace = re.compile(r"\s+")
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_number_literal = re.compile(r"\b\d+(?:\.\d+)?\b")
+_placeholder = re.compile(
+    r"%\([^)]+\)s|\$\d+|:\w+|\?|__\[POSTCOMPILE_\w+\]|%s"
+)
+_placeholder_list = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def normalize_sql(statement: str) -> str:
+    """Replace literals and placeholders so equal query shapes group up"""
+    statement = _whitespace.sub(" ", statement).strip()
+    statement = _string_literal.sub("?", statement)
+    statement = _placeholder.sub("?", statement)
+    statement = _number_literal.sub("?", statement)
+    # IN lists of any length are the same query
+    return _placeholder_list.sub("(?, ...)", statement)
+
+
+def _statement_type(statement: str) -> str:
+    return statement.lstrip().split(" ", 1)[0].upper() or "UNKNOWN"
+
+
+@contextlib.contextmanager
+def query_scope(kind: str, name: str) -> Iterator[QueryScope]:
+    """Count the statements executed while a request or a task runs"""
+    scope = QueryScope(kind=kind, name=name)
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+        labels = {"kind": kind}
+        if kind == "task":
+            # Task names are bounded, request paths are not
+            labels["name"] = name
+
+        metrics.observe_histogram(
+            "db_queries_per_scope",
+            scope.queries,
+            labels=labels,
+            buckets=QUERY_BUCKETS,
+        )
+        if scope.queries >= secret.N_PLUS_ONE_QUERY_THRESHOLD:
+            logger.warning(
+                "%s %s executed %d queries in %.1f ms, most repeated: %s",
+                kind,
+                name,
+                scope.queries,
+                scope.seconds * 1000,
+                max(scope.statements, key=scope.statements.get),
+            )
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Record per statement latency, scope query counts and slow queries.
+
+    Pass the sync_engine of an AsyncEngine, the cursor events fire there.
+    """
+    labels_by_type: dict[str, dict] = {}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault("query_started_at", []).append(
+            (context, time.perf_counter())
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        _, started_at = conn.info["query_started_at"].pop()
+        seconds = time.perf_counter() - started_at
+
+        statement_type = _statement_type(statement)
+        labels = labels_by_type.get(statement_type)
+        if labels is None:
+            labels = {"engine": name, "statement": statement_type}
+            labels_by_type[statement_type] = labels
+
+        metrics.observe_histogram(
+            "db_statement_seconds", seconds, labels=labels
+        )
+
+        scope = _current_scope.get()
+        normalized = None
+        if scope is not None:
+            normalized = normalize_sql(statement)
+            scope.queries += 1
+            scope.seconds += seconds
+            scope.statements[normalized] = (
+                scope.statements.get(normalized, 0) + 1
+            )
+
+        if seconds * 1000 >= secret.SLOW_QUERY_THRESHOLD_IN_MS:
+            metrics.increment_counter("db_slow_queries_total", labels=labels)
+            logger.warning(
+                "Slow query on %s (%.1f ms): %s",
+                name,
+                seconds * 1000,
+                normalized or normalize_sql(statement),
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # A failed statement never reaches after_cursor_execute, drop its
+        # start so the pooled connection does not time the next ones off it.
+        # Errors fetching the results come after it, nothing to drop then.
+        conn = exception_context.connection
+        if conn is None or conn.closed or conn.invalidated:
+            return
+
+        query_started_at = conn.info.get("query_started_at")
+        if (
+            query_started_at
+            and query_started_at[-1][0]
+            is exception_context.execution_context
+        ):
+            query_started_at.pop()
+
+
+class QueryCountMiddleware:
+    """ASGI middleware that opens a query scope for every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        with query_scope(
+            kind="request", name=f"{scope['method']} {scope['path']}"
+        ):
+            return await self.app(scope, receive, send)
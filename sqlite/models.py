@@ -3,7 +3,7 @@ from typing import Optional
 from datetime import datetime, time, timezone
 from datetime import date as dtdate
 
-from sqlalchemy import DateTime, Enum, ForeignKey, UniqueConstraint
+from sqlalchemy import DateTime, Enum, ForeignKey, Index, UniqueConstraint
 
 from sqlalchemy.orm import relationship, mapped_column, Mapped
 
@@ -21,6 +21,7 @@ from sqlite.enums import (
     DesignationsEnum,
     DaysEnum,
     AttendanceEnum,
+    StatsCountersEnum,
 )
 
 
@@ -28,7 +29,7 @@ class TimestampCreateOnlyBaseModel(Base):
     __abstract__ = True
 
     created_at_in_utc: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), default=datetime.now(tz=timezone.utc)
+        DateTime(timezone=True), default=lambda: datetime.now(tz=timezone.utc)
     )
 
 
@@ -37,7 +38,7 @@ class TimestampBaseModel(TimestampCreateOnlyBaseModel):
 
     updated_at_in_utc: Mapped[Optional[datetime]] = mapped_column(
         DateTime(timezone=True),
-        onupdate=datetime.now(tz=timezone.utc),
+        onupdate=lambda: datetime.now(tz=timezone.utc),
     )
 
 
@@ -127,6 +128,12 @@ class LocationModel(TimestampBaseModel):
 # between ScheduleModel and UserModel
 class ScheduleUserModel(Base):
     __tablename__ = "schedule_users"
+    # The primary key leads with user_id, rosters are read by schedule_id
+    __table_args__ = (
+        Index(
+            "ix_schedule_users_schedule_id_user_id", "schedule_id", "user_id"
+        ),
+    )
 
     user_id: Mapped[int] = mapped_column(
         ForeignKey("users.id"), primary_key=True
@@ -138,6 +145,11 @@ class ScheduleUserModel(Base):
 
 class ScheduleModel(TimestampBaseModel):
     __tablename__ = "schedules"
+    # get_schedules_by_date_filter, one index per branch of the OR
+    __table_args__ = (
+        Index("ix_schedules_day_is_reoccurring", "day", "is_reoccurring"),
+        Index("ix_schedules_date", "date"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
 
@@ -209,6 +221,14 @@ class ScheduleModel(TimestampBaseModel):
 # between ScheduleInstanceModel and UserModel
 class ScheduleInstanceUserModel(Base):
     __tablename__ = "schedule_instance_users"
+    # The primary key leads with user_id, rosters are read by instance
+    __table_args__ = (
+        Index(
+            "ix_schedule_instance_users_schedule_instance_id_user_id",
+            "schedule_instance_id",
+            "user_id",
+        ),
+    )
 
     user_id: Mapped[int] = mapped_column(
         ForeignKey("users.id"), primary_key=True
@@ -222,6 +242,20 @@ class ScheduleInstanceUserModel(Base):
 # ScheduleInstance (Class)
 class ScheduleInstanceModel(TimestampBaseModel):
     __tablename__ = "schedule_instances"
+    # Natural key, a schedule can only have one instance per date and slot
+    __table_args__ = (
+        UniqueConstraint(
+            "schedule_id",
+            "date",
+            "start_time_in_utc",
+            "end_time_in_utc",
+            name="uq_schedule_instances_schedule_id_date_times",
+        ),
+        # The "today" / date range queries, for everyone or one teacher
+        Index("ix_schedule_instances_date_teacher_id", "date", "teacher_id"),
+        # Keyset pagination of the list, ordered by (date, id)
+        Index("ix_schedule_instances_date_id", "date", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
 
@@ -277,8 +311,91 @@ class ScheduleInstanceModel(TimestampBaseModel):
         self.location_id = schedule_instance.location_id
 
 
+# Remembers up to which schedule the instances of a date are materialized
+class ScheduleInstanceWatermarkModel(Base):
+    __tablename__ = "schedule_instance_watermarks"
+
+    date: Mapped[dtdate] = mapped_column(primary_key=True)
+
+    last_schedule_id: Mapped[Optional[int]] = mapped_column(default=None)
+    last_schedule_updated_at_in_utc: Mapped[Optional[datetime]] = (
+        mapped_column(DateTime(timezone=True), default=None)
+    )
+
+    updated_at_in_utc: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(tz=timezone.utc),
+        onupdate=lambda: datetime.now(tz=timezone.utc),
+    )
+
+
+# Dashboard counters, kept up to date by the CRUD and recounted periodically
+class StatsCounterModel(Base):
+    __tablename__ = "stats_counters"
+
+    name: Mapped[StatsCountersEnum] = mapped_column(
+        Enum(
+            StatsCountersEnum,
+            name="stats_counter_name",
+            validate_strings=True,
+        ),
+        primary_key=True,
+    )
+    value: Mapped[int] = mapped_column(default=0)
+
+    # Last full recount, anything after it was applied incrementally
+    refreshed_at_in_utc: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(tz=timezone.utc),
+    )
+    updated_at_in_utc: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(tz=timezone.utc),
+    )
+
+
+# Attendance counts per day, schedule and student, see crud/analytics.py
+class AttendanceRollupModel(Base):
+    __tablename__ = "attendance_rollups"
+
+    date: Mapped[dtdate] = mapped_column(primary_key=True)
+    schedule_id: Mapped[int] = mapped_column(
+        ForeignKey("schedules.id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    # Of the instances, a schedule's teacher or location can be moved
+    teacher_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    location_id: Mapped[int] = mapped_column(
+        ForeignKey("locations.id", ondelete="CASCADE"), primary_key=True
+    )
+
+    expected_count: Mapped[int] = mapped_column(default=0)
+    present_count: Mapped[int] = mapped_column(default=0)
+    late_count: Mapped[int] = mapped_column(default=0)
+    # Only instances that have ended, the rest are still pending
+    absent_count: Mapped[int] = mapped_column(default=0)
+
+    refreshed_at_in_utc: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(tz=timezone.utc),
+    )
+
+
 class AttendanceModel(TimestampCreateOnlyBaseModel):
     __tablename__ = "attendances"
+    __table_args__ = (
+        Index(
+            "ix_attendances_schedule_instance_id_user_id",
+            "schedule_instance_id",
+            "user_id",
+        ),
+        # Dates with new attendances, see refresh_attendance_rollups
+        Index("ix_attendances_created_at_in_utc", "created_at_in_utc"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
 
@@ -326,6 +443,13 @@ class TemporaryModel(Base):
 
 class AttendanceTrackingModel(Base):
     __tablename__ = "attendance_tracking"
+    __table_args__ = (
+        Index(
+            "ix_attendance_tracking_schedule_instance_id_user_id",
+            "schedule_instance_id",
+            "user_id",
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
 
@@ -354,5 +478,5 @@ class AttendanceTrackingModel(Base):
 
     created_at_in_utc: Mapped[Optional[datetime]] = mapped_column(
         DateTime(timezone=True),
-        default=datetime.now(tz=timezone.utc),
+        default=lambda: datetime.now(tz=timezone.utc),
     )
@@ -1,5 +1,6 @@
 import re
 from datetime import datetime, date, time, timedelta, timezone
+from typing import Generic, TypeVar
 
 from fastapi import Query
 from pydantic import BaseModel, ConfigDict, field_validator, model_validator
@@ -9,6 +10,10 @@ from sqlite.enums import (
     DesignationsEnum,
     DaysEnum,
     AttendanceEnum,
+    AttendanceAnalyticsDimensionEnum,
+    AttendanceAnalyticsBucketEnum,
+    ScheduleInstanceLoadProfileEnum,
+    AvailabilityResourceEnum,
 )
 
 from utils.date_utils import (
@@ -20,6 +25,8 @@ from utils.date_utils import (
 
 from constants import time_constants
 
+T = TypeVar("T")
+
 
 def replace_empty_strings_with_null(cls, value):
     if isinstance(value, str):
@@ -121,6 +128,25 @@ class User(UserBaseClass):
         return self
 
 
+# User Import
+class UserImportRowError(BaseModel):
+    # 1-based, not counting the CSV header
+    row: int
+    email: str | None = None
+    errors: list[str]
+
+
+class UserImportReport(BaseModel):
+    total_rows: int
+    created_count: int
+    failed_count: int
+    errors: list[UserImportRowError]
+    elapsed_seconds: float
+    hashing_seconds: float
+    insert_seconds: float
+    rows_per_second: float
+
+
 # Location
 class LocationBaseClass(BaseModel):
     title: str
@@ -216,6 +242,55 @@ class Schedule(ScheduleBaseClass):
     )
 
 
+# Timetable Import
+class TimetableImportRowError(BaseModel):
+    # 1-based position in the imported schedules
+    row: int
+    errors: list[str]
+
+
+class TimetableImportReport(BaseModel):
+    total_rows: int
+    created_count: int
+    failed_count: int
+    errors: list[TimetableImportRowError]
+    elapsed_seconds: float
+    check_seconds: float
+    insert_seconds: float
+
+
+# Availability
+class AvailabilitySearchClass(BaseModel):
+    date: date
+    start_time_in_utc: time
+    end_time_in_utc: time
+    location_ids: list[int] = []
+    teacher_ids: list[int] = []
+
+    @model_validator(mode="after")
+    def check_window(self) -> "AvailabilitySearchClass":
+        if self.end_time_in_utc <= self.start_time_in_utc:
+            raise ValueError("end_time_in_utc must be after start_time_in_utc")
+
+        return self
+
+
+class AvailabilityBlock(BaseModel):
+    start_time_in_utc: time
+    end_time_in_utc: time
+    is_busy: bool
+    # The schedules booking a busy block
+    schedule_ids: list[int] = []
+
+
+class Availability(BaseModel):
+    resource: AvailabilityResourceEnum
+    id: int
+    # Free for the whole search window
+    is_free: bool
+    blocks: list[AvailabilityBlock]
+
+
 # Schedule Search
 class ScheduleSearchBaseClass(BaseModel):
     teacher_id: int
@@ -267,6 +342,68 @@ class ScheduleInstance(ScheduleInstanceBaseClass):
     )
 
 
+# Schedule Instance load profiles, see get_schedule_instance_load_options
+class UserSummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    full_name: str
+
+
+class LocationSummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: str
+    bluetooth_address: str
+    coordinates: str
+
+
+class ScheduleSummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: str
+    is_reoccurring: bool
+
+
+class ScheduleInstanceListItem(ScheduleInstanceBaseClass):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+
+    date: date
+    start_time_in_utc: time
+    end_time_in_utc: time
+
+    schedule: ScheduleSummary
+
+    location: Location
+    teacher: UserSummary
+
+
+class ScheduleInstanceMobile(ScheduleInstanceBaseClass):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+
+    date: date
+    start_time_in_utc: time
+    end_time_in_utc: time
+
+    schedule: ScheduleSummary
+
+    location: LocationSummary
+    teacher: UserSummary
+
+
+SCHEDULE_INSTANCE_SCHEMAS = {
+    ScheduleInstanceLoadProfileEnum.DETAIL: ScheduleInstance,
+    ScheduleInstanceLoadProfileEnum.LIST: ScheduleInstanceListItem,
+    ScheduleInstanceLoadProfileEnum.MOBILE: ScheduleInstanceMobile,
+}
+
+
 # Attendance
 class AttendanceBaseClass(BaseModel):
     pass
@@ -317,6 +454,40 @@ class AttendanceSearchClass(BaseModel):
     end_date: date = Query(datetime.now(tz=timezone.utc).date())
 
 
+# Attendance Analytics
+class AttendanceAnalyticsSearchClass(BaseModel):
+    start_date: date = Query(
+        datetime.strftime(
+            datetime.now(tz=timezone.utc) - timedelta(days=30),
+            time_constants.DATE_TIME_FORMAT,
+        )
+    )
+    end_date: date = Query(datetime.now(tz=timezone.utc).date())
+    group_by: list[AttendanceAnalyticsDimensionEnum] = Query([])
+    bucket: AttendanceAnalyticsBucketEnum | None = Query(None)
+
+    user_id: int | None = Query(None)
+    schedule_id: int | None = Query(None)
+    teacher_id: int | None = Query(None)
+    location_id: int | None = Query(None)
+
+
+class AttendanceAnalytics(BaseModel):
+    # Only the grouped by dimensions are set
+    bucket_start_date: date | None = None
+    user_id: int | None = None
+    schedule_id: int | None = None
+    teacher_id: int | None = None
+    location_id: int | None = None
+
+    expected_count: int
+    present_count: int
+    late_count: int
+    absent_count: int
+    # (present + late) / (present + late + absent), None before any ended
+    attendance_rate: float | None = None
+
+
 # Stats
 class StatsBaseClass(BaseModel):
     teachers_count: int
@@ -326,6 +497,18 @@ class StatsBaseClass(BaseModel):
     schedule_instances_count: int
 
 
+class Stats(StatsBaseClass):
+    model_config = ConfigDict(
+        json_encoders={datetime: convert_datetime_to_iso_8601_with_z_suffix},
+    )
+
+    # Whether the counts come from the stats_counters table
+    is_cached: bool = False
+    # Counts are exact as of this time, and approximate after it
+    refreshed_at_in_utc: datetime | None = None
+    updated_at_in_utc: datetime | None = None
+
+
 class TemporaryBaseClass(BaseModel):
     id: int
 
@@ -357,4 +540,17 @@ class AttendanceTracking(AttendanceTrackingBaseClass):
     )
 
 
+# Keyset pagination
+class KeysetPageParams(BaseModel):
+    # next_cursor of the previous page, none for the first page
+    cursor: str | None = Query(None)
+    size: int = Query(50, ge=1, le=100)
+
+
+class KeysetPage(BaseModel, Generic[T]):
+    items: list[T]
+    # None on the last page
+    next_cursor: str | None = None
+
+
 Token.model_rebuild()
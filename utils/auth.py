@@ -14,6 +14,8 @@ from sqlite.models import UserModel
 import sqlite.crud.users as users
 from sqlite.schemas import TokenData
 
+from utils import cache
+
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -39,12 +41,27 @@ async def get_current_user(
         token_data = TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    user = await users.get_user_by_email(user_email=token_data.email, db=db)
 
+    user = cache.current_user_cache.get(token_data.email)
     if user is None:
-        raise credentials_exception
+        # Read before the row, an invalidation committed meanwhile skips the
+        # fill instead of caching the old row until the TTL
+        generation = cache.current_user_cache.generation
+        user = await users.get_user_by_email(
+            user_email=token_data.email, db=db
+        )
+
+        if user is None:
+            raise credentials_exception
+
+        # Cache a detached copy, never the instance a request may modify
+        db.expunge(user)
+        cache.current_user_cache.set(
+            token_data.email, user, generation=generation
+        )
 
-    return user
+    # Attach a copy to this request's session without a round trip
+    return await db.merge(user, load=False)
 
 
 async def should_be_admin_user(
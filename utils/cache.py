@@ -0,0 +1,402 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+import redis
+import redis.asyncio
+
+from secret import secret
+
+from sqlite.enums import ScheduleInstanceLoadProfileEnum
+
+from utils import metrics
+from utils.redis_clients import get_redis_client, get_async_redis_client
+
+
+# One hash per user and date, a field per load profile plus a generation
+# that every invalidation bumps
+TODAY_SCHEDULE_INSTANCES_KEY = "cache:today_classes:{date}:{user_id}"
+GENERATION_FIELD = "generation"
+# Keys per pipeline round trip when invalidating
+INVALIDATION_BATCH_SIZE = 1000
+
+# Only fill when nothing invalidated the key since the miss was read,
+# otherwise a slow fill could put back what an invalidation just removed
+FILL_SCRIPT = """
+if (redis.call("hget", KEYS[1], ARGV[1]) or "0") == ARGV[2] then
+    redis.call("hset", KEYS[1], ARGV[3], ARGV[4])
+    redis.call("expire", KEYS[1], ARGV[5])
+    return 1
+end
+return 0
+"""
+INVALIDATE_SCRIPT = """
+local generation = redis.call("hincrby", KEYS[1], ARGV[1], 1)
+redis.call("hdel", KEYS[1], unpack(ARGV, 3))
+redis.call("expire", KEYS[1], ARGV[2])
+return generation
+"""
+
+
+def get_today_schedule_instances_key(user_id: int, on_date: date) -> str:
+    return TODAY_SCHEDULE_INSTANCES_KEY.format(
+        date=on_date.isoformat(), user_id=user_id
+    )
+
+
+async def get_cached_today_schedule_instances(
+    user_id: int,
+    on_date: date,
+    profile: ScheduleInstanceLoadProfileEnum,
+    client: redis.asyncio.Redis | None = None,
+) -> tuple[list[dict] | None, str | None]:
+    """The cached page (None on a miss) and the generation to fill it with.
+
+    The generation is None when Redis is unavailable, skip the fill then.
+    """
+    client = client if client is not None else get_async_redis_client()
+    try:
+        value, generation = await client.hmget(
+            get_today_schedule_instances_key(user_id=user_id, on_date=on_date),
+            [profile.value, GENERATION_FIELD],
+        )
+    except redis.RedisError as e:
+        metrics.increment_counter("today_classes_cache_errors_total")
+        print("There seems to be an error")
+        print(e)
+        return None, None
+
+    metrics.increment_counter(
+        (
+            "today_classes_cache_hits_total"
+            if value is not None
+            else "today_classes_cache_misses_total"
+        ),
+        labels={"profile": profile.value},
+    )
+
+    return (
+        json.loads(value) if value is not None else None,
+        generation.decode() if generation is not None else "0",
+    )
+
+
+async def set_cached_today_schedule_instances(
+    user_id: int,
+    on_date: date,
+    profile: ScheduleInstanceLoadProfileEnum,
+    generation: str,
+    value: list[dict],
+    client: redis.asyncio.Redis | None = None,
+) -> bool:
+    client = client if client is not None else get_async_redis_client()
+    try:
+        is_filled = bool(
+            await client.eval(
+                FILL_SCRIPT,
+                1,
+                get_today_schedule_instances_key(
+                    user_id=user_id, on_date=on_date
+                ),
+                GENERATION_FIELD,
+                generation,
+                profile.value,
+                json.dumps(value),
+                secret.TODAY_SCHEDULE_INSTANCES_CACHE_TTL_IN_SECONDS,
+            )
+        )
+    except redis.RedisError as e:
+        metrics.increment_counter("today_classes_cache_errors_total")
+        print("There seems to be an error")
+        print(e)
+        return False
+
+    if not is_filled:
+        metrics.increment_counter("today_classes_cache_stale_fills_total")
+
+    return is_filled
+
+
+def _get_invalidation_batches(user_ids_by_date: dict) -> list[list[str]]:
+    keys = [
+        get_today_schedule_instances_key(user_id=user_id, on_date=on_date)
+        for on_date, user_ids in user_ids_by_date.items()
+        for user_id in user_ids
+    ]
+
+    return [
+        keys[i : i + INVALIDATION_BATCH_SIZE]
+        for i in range(0, len(keys), INVALIDATION_BATCH_SIZE)
+    ]
+
+
+def _queue_invalidations(pipeline, keys: list[str]) -> None:
+    for key in keys:
+        pipeline.eval(
+            INVALIDATE_SCRIPT,
+            1,
+            key,
+            GENERATION_FIELD,
+            secret.TODAY_SCHEDULE_INSTANCES_CACHE_TTL_IN_SECONDS,
+            *(profile.value for profile in ScheduleInstanceLoadProfileEnum),
+        )
+
+
+async def invalidate_today_schedule_instances(
+    user_ids_by_date: dict[date, set[int]],
+    client: redis.asyncio.Redis | None = None,
+) -> int:
+    """Drop the cached classes of the users on those dates, from the API.
+
+    Call it after the commit, never fails the request.
+    """
+    client = client if client is not None else get_async_redis_client()
+
+    keys_count = 0
+    try:
+        for keys in _get_invalidation_batches(
+            user_ids_by_date=user_ids_by_date
+        ):
+            pipeline = client.pipeline(transaction=False)
+            _queue_invalidations(pipeline=pipeline, keys=keys)
+            await pipeline.execute()
+            keys_count += len(keys)
+    except redis.RedisError as e:
+        metrics.increment_counter("today_classes_cache_errors_total")
+        print("There seems to be an error")
+        print(e)
+
+    metrics.increment_counter(
+        "today_classes_cache_invalidations_total", keys_count
+    )
+
+    return keys_count
+
+
+def invalidate_today_schedule_instances_sync(
+    user_ids_by_date: dict[date, set[int]],
+    client: redis.Redis | None = None,
+) -> int:
+    """invalidate_today_schedule_instances for the Celery worker"""
+    client = client if client is not None else get_redis_client()
+
+    keys_count = 0
+    try:
+        for keys in _get_invalidation_batches(
+            user_ids_by_date=user_ids_by_date
+        ):
+            pipeline = client.pipeline(transaction=False)
+            _queue_invalidations(pipeline=pipeline, keys=keys)
+            pipeline.execute()
+            keys_count += len(keys)
+    except redis.RedisError as e:
+        metrics.increment_counter("today_classes_cache_errors_total")
+        print("There seems to be an error")
+        print(e)
+
+    metrics.increment_counter(
+        "today_classes_cache_invalidations_total", keys_count
+    )
+
+    return keys_count
+
+
+class TTLLRUCache:
+    """A bounded in-process LRU whose entries expire after ttl_in_seconds.
+
+    Every delete and clear bumps the generation, like the generation field
+    of the today's classes hashes. Read it before loading what a miss fills
+    with and pass it to set, so a fill racing an invalidation is skipped.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl_in_seconds: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_in_seconds = ttl_in_seconds
+
+        self._entries: OrderedDict = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+                metrics.increment_counter(
+                    "in_process_cache_expirations_total",
+                    labels={"cache": self.name},
+                )
+
+            if entry is None:
+                metrics.increment_counter(
+                    "in_process_cache_misses_total",
+                    labels={"cache": self.name},
+                )
+                return None
+
+            self._entries.move_to_end(key)
+
+        metrics.increment_counter(
+            "in_process_cache_hits_total", labels={"cache": self.name}
+        )
+
+        return entry[1]
+
+    def set(self, key, value, generation: int | None = None) -> bool:
+        with self._lock:
+            # Something was invalidated since the value was loaded, it may
+            # be the old value of this very key
+            if generation is not None and generation != self._generation:
+                metrics.increment_counter(
+                    "in_process_cache_stale_fills_total",
+                    labels={"cache": self.name},
+                )
+                return False
+
+            self._entries[key] = (
+                time.monotonic() + self.ttl_in_seconds,
+                value,
+            )
+            self._entries.move_to_end(key)
+
+            evicted = 0
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                evicted += 1
+
+            size = len(self._entries)
+
+        if evicted:
+            metrics.increment_counter(
+                "in_process_cache_evictions_total",
+                evicted,
+                labels={"cache": self.name},
+            )
+        metrics.set_gauge(
+            "in_process_cache_size", size, labels={"cache": self.name}
+        )
+
+        return True
+
+    def delete(self, key) -> bool:
+        with self._lock:
+            # Even without an entry, a miss may be loading the old value
+            self._generation += 1
+            is_deleted = self._entries.pop(key, None) is not None
+
+        if is_deleted:
+            metrics.increment_counter(
+                "in_process_cache_invalidations_total",
+                labels={"cache": self.name},
+            )
+
+        return is_deleted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+# Detached UserModel by email (the JWT subject) for get_current_user
+current_user_cache = TTLLRUCache(
+    name="current_user",
+    max_size=secret.CURRENT_USER_CACHE_MAX_SIZE,
+    ttl_in_seconds=secret.CURRENT_USER_CACHE_TTL_IN_SECONDS,
+)
+CURRENT_USER_INVALIDATION_CHANNEL = "cache:current_user:invalidate"
+
+
+async def invalidate_current_user(
+    emails: list[str], client: redis.asyncio.Redis | None = None
+) -> None:
+    """Drop the cached users here and, through pub/sub, in every other API
+    process. Call it after the commit, never fails the request.
+    """
+    for email in emails:
+        current_user_cache.delete(email)
+
+    client = client if client is not None else get_async_redis_client()
+    try:
+        await client.publish(
+            CURRENT_USER_INVALIDATION_CHANNEL, json.dumps(emails)
+        )
+    except redis.RedisError as e:
+        # The other processes catch up within the TTL
+        print("There seems to be an error")
+        print(e)
+
+
+async def listen_for_current_user_invalidations(
+    client: redis.asyncio.Redis | None = None,
+) -> None:
+    """Apply the invalidations published by the other API processes.
+
+    Runs until cancelled, start it as a task in the app lifespan.
+    """
+    client = client if client is not None else get_async_redis_client()
+    while True:
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(CURRENT_USER_INVALIDATION_CHANNEL)
+                # Whatever was published while not subscribed is lost
+                current_user_cache.clear()
+
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    for email in json.loads(message["data"]):
+                        current_user_cache.delete(email)
+        except redis.RedisError as e:
+            print("There seems to be an error")
+            print(e)
+            await asyncio.sleep(1)
+
+
+# Interval index of the schedules by (date, schedules version), see
+# sqlite.crud.availability. Every schedule write bumps the version, so
+# every API process stops using its indexes without a listener
+schedule_interval_index_cache = TTLLRUCache(
+    name="schedule_interval_index",
+    max_size=64,
+    ttl_in_seconds=secret.SCHEDULE_INTERVAL_INDEX_CACHE_TTL_IN_SECONDS,
+)
+SCHEDULES_VERSION_KEY = "cache:schedules:version"
+
+
+async def get_schedules_version(
+    client: redis.asyncio.Redis | None = None,
+) -> str | None:
+    """None when Redis is unavailable, only the TTL bounds staleness then"""
+    client = client if client is not None else get_async_redis_client()
+    try:
+        version = await client.get(SCHEDULES_VERSION_KEY)
+    except redis.RedisError as e:
+        print("There seems to be an error")
+        print(e)
+        return None
+
+    return version.decode() if version is not None else "0"
+
+
+async def invalidate_schedule_interval_indexes(
+    client: redis.asyncio.Redis | None = None,
+) -> None:
+    """Call it after every schedule write is committed, never fails it"""
+    schedule_interval_index_cache.clear()
+
+    client = client if client is not None else get_async_redis_client()
+    try:
+        await client.incr(SCHEDULES_VERSION_KEY)
+    except redis.RedisError as e:
+        print("There seems to be an error")
+        print(e)
@@ -0,0 +1,104 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+
+class IntervalIndex:
+    """Half-open [start, end) intervals grouped by key, e.g. a room on a day.
+
+    Per key the intervals are kept sorted by start along with the running
+    maximum of their ends. An overlap lookup bisects to the last interval
+    starting before the probe ends, then walks back only while that
+    running maximum still reaches past the probe's start.
+    """
+
+    def __init__(self):
+        self._starts = defaultdict(list)
+        self._ends = defaultdict(list)
+        self._max_ends = defaultdict(list)
+        self._values = defaultdict(list)
+
+    def __len__(self) -> int:
+        return sum(len(starts) for starts in self._starts.values())
+
+    def keys(self):
+        return self._starts.keys()
+
+    def add(self, key, start, end, value) -> None:
+        starts = self._starts[key]
+        ends = self._ends[key]
+        max_ends = self._max_ends[key]
+
+        i = bisect_right(starts, start)
+        starts.insert(i, start)
+        ends.insert(i, end)
+        self._values[key].insert(i, value)
+
+        # Only the running maximum from the new interval on can change
+        max_ends.insert(i, end)
+        for j in range(i, len(starts)):
+            max_ends[j] = max(ends[j], max_ends[j - 1]) if j else ends[j]
+
+    def overlapping(self, key, start, end) -> list:
+        """Values of the intervals of key overlapping [start, end)"""
+        if key not in self._starts:
+            return []
+
+        starts = self._starts[key]
+        ends = self._ends[key]
+        max_ends = self._max_ends[key]
+        values = self._values[key]
+
+        overlapping = []
+        i = bisect_left(starts, end) - 1
+        while i >= 0 and max_ends[i] > start:
+            if ends[i] > start:
+                overlapping.append(values[i])
+            i -= 1
+        overlapping.reverse()
+
+        return overlapping
+
+    def intervals(self, key) -> list[tuple]:
+        """(start, end, value) of every interval of key, sorted by start"""
+        return list(
+            zip(
+                self._starts.get(key, []),
+                self._ends.get(key, []),
+                self._values.get(key, []),
+            )
+        )
+
+
+def get_free_busy_blocks(intervals: list[tuple], start, end) -> list[tuple]:
+    """Split [start, end) into free and busy blocks.
+
+    Takes (start, end, value) sorted by start, e.g. IntervalIndex.intervals.
+    Returns (start, end, values) in order, values is empty for a free block
+    and lists the intervals making a busy one. Touching intervals make one
+    busy block.
+    """
+    blocks = []
+    cursor = start
+    for interval_start, interval_end, value in intervals:
+        if interval_end <= start or interval_start >= end:
+            continue
+        interval_start = max(interval_start, start)
+        interval_end = min(interval_end, end)
+
+        if blocks and blocks[-1][2] and interval_start <= blocks[-1][1]:
+            previous_start, previous_end, values = blocks[-1]
+            blocks[-1] = (
+                previous_start,
+                max(previous_end, interval_end),
+                values + [value],
+            )
+        else:
+            if interval_start > cursor:
+                blocks.append((cursor, interval_start, []))
+            blocks.append((interval_start, interval_end, [value]))
+        cursor = max(cursor, blocks[-1][1])
+
+    if cursor < end:
+        blocks.append((cursor, end, []))
+
+    return blocks
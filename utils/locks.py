@@ -0,0 +1,150 @@
+import contextlib
+import threading
+import time
+import uuid
+from typing import Iterator
+
+import redis
+
+from utils import metrics
+from utils.redis_clients import get_redis_client
+
+
+# Only extend / delete the key while we still own it
+RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLease:
+    """A Redis backed lease, only one holder across every worker replica.
+
+    The key expires after ttl_in_seconds so a crashed holder can not block
+    the others for long, hold() keeps renewing it while the work runs.
+    Pass the token of a lease acquired elsewhere, e.g. by the task that
+    fanned the work out, to keep() or release() it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl_in_seconds: float,
+        client: redis.Redis | None = None,
+        token: str | None = None,
+    ):
+        self.name = name
+        self.key = f"lease:{name}"
+        self.ttl_in_seconds = ttl_in_seconds
+        self.token = token if token is not None else uuid.uuid4().hex
+        self.is_lost = False
+
+        self._client = client if client is not None else get_redis_client()
+        self._stop_renewing = threading.Event()
+
+    def acquire(self) -> bool:
+        is_acquired = bool(
+            self._client.set(
+                self.key,
+                self.token,
+                nx=True,
+                px=int(self.ttl_in_seconds * 1000),
+            )
+        )
+
+        metrics.increment_counter(
+            (
+                "redis_lease_acquired_total"
+                if is_acquired
+                else "redis_lease_contended_total"
+            ),
+            labels={"lease": self.name},
+        )
+
+        return is_acquired
+
+    def renew(self) -> bool:
+        is_renewed = bool(
+            self._client.eval(
+                RENEW_SCRIPT,
+                1,
+                self.key,
+                self.token,
+                int(self.ttl_in_seconds * 1000),
+            )
+        )
+
+        if is_renewed:
+            metrics.increment_counter(
+                "redis_lease_renewed_total", labels={"lease": self.name}
+            )
+        else:
+            self.is_lost = True
+            metrics.increment_counter(
+                "redis_lease_lost_total", labels={"lease": self.name}
+            )
+
+        return is_renewed
+
+    def release(self) -> bool:
+        return bool(self._client.eval(RELEASE_SCRIPT, 1, self.key, self.token))
+
+    def _keep_renewing(self) -> None:
+        while not self._stop_renewing.wait(self.ttl_in_seconds / 3):
+            try:
+                if not self.renew():
+                    return
+            except redis.RedisError as e:
+                print("There seems to be an error")
+                print(e)
+
+    @contextlib.contextmanager
+    def _renewing(self) -> Iterator[None]:
+        self._stop_renewing.clear()
+        renewer = threading.Thread(target=self._keep_renewing, daemon=True)
+        renewer.start()
+        try:
+            yield
+        finally:
+            self._stop_renewing.set()
+            renewer.join()
+
+    @contextlib.contextmanager
+    def hold(self) -> Iterator[bool]:
+        """Yield whether the lease was acquired, renew it until exit"""
+        if not self.acquire():
+            yield False
+            return
+
+        acquired_at = time.perf_counter()
+        try:
+            with self._renewing():
+                yield True
+        finally:
+            self.release()
+            metrics.observe_histogram(
+                "redis_lease_held_seconds",
+                time.perf_counter() - acquired_at,
+                labels={"lease": self.name},
+            )
+
+    @contextlib.contextmanager
+    def keep(self) -> Iterator[bool]:
+        """Yield whether the lease is still held, renew it until exit.
+
+        Leaves it held on exit, whoever acquired it releases it.
+        """
+        if not self.renew():
+            yield False
+            return
+
+        with self._renewing():
+            yield True
@@ -0,0 +1,132 @@
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+_lock = threading.Lock()
+_counters: dict[tuple[str, tuple], float] = {}
+_gauges: dict[tuple[str, tuple], float] = {}
+# (name, labels) -> (buckets, bucket_counts, sum, count)
+_histograms: dict[tuple[str, tuple], list] = {}
+
+
+def _key(name: str, labels: dict | None) -> tuple[str, tuple]:
+    return name, tuple(sorted((labels or {}).items()))
+
+
+def increment_counter(
+    name: str, value: float = 1, labels: dict | None = None
+) -> None:
+    """Increment a monotonically increasing counter"""
+    key = _key(name=name, labels=labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, labels: dict | None = None) -> None:
+    """Set a gauge to the given value"""
+    with _lock:
+        _gauges[_key(name=name, labels=labels)] = value
+
+
+def observe_histogram(
+    name: str,
+    value: float,
+    labels: dict | None = None,
+    buckets: tuple = DEFAULT_BUCKETS,
+) -> None:
+    """Record a value (seconds for latencies) in a cumulative histogram"""
+    key = _key(name=name, labels=labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = [buckets, [0] * (len(buckets) + 1), 0.0, 0]
+            _histograms[key] = histogram
+
+        histogram[1][bisect_left(histogram[0], value)] += 1
+        histogram[2] += value
+        histogram[3] += 1
+
+
+def _format_labels(labels: tuple, **extra) -> str:
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def render_metrics() -> str:
+    """Render every metric in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        for metrics, metric_type in (
+            (_counters, "counter"),
+            (_gauges, "gauge"),
+        ):
+            typed = set()
+            for (name, labels), value in sorted(metrics.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} {metric_type}")
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        typed = set()
+        for (name, labels), histogram in sorted(
+            _histograms.items(), key=lambda item: item[0]
+        ):
+            buckets, bucket_counts, total, count = histogram
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+
+            cumulative = 0
+            for bucket, bucket_count in zip((*buckets, "+Inf"), bucket_counts):
+                cumulative += bucket_count
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels, le=bucket)} "
+                    f"{cumulative}"
+                )
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int) -> ThreadingHTTPServer:
+    """Serve /metrics for scraping from a daemon thread"""
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
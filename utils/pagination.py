@@ -0,0 +1,117 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime, time
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from sqlite import models
+from sqlite.schemas import KeysetPage, KeysetPageParams
+
+
+# Sort key of the list queries per model, has to end with a unique column.
+# Models not listed here are paged by id.
+KEYSET_ORDER_COLUMNS = {
+    models.ScheduleInstanceModel: (
+        models.ScheduleInstanceModel.date,
+        models.ScheduleInstanceModel.id,
+    ),
+}
+
+
+def get_keyset_order_columns(query: Select) -> tuple:
+    entity = query.column_descriptions[0]["entity"]
+
+    return KEYSET_ORDER_COLUMNS.get(entity, (entity.id,))
+
+
+def encode_cursor(values: tuple) -> str:
+    """Opaque cursor from the sort key of the last row of a page"""
+    payload = json.dumps(
+        [
+            value.isoformat() if isinstance(value, (date, time)) else value
+            for value in values
+        ],
+        separators=(",", ":"),
+    )
+
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order_columns: tuple) -> tuple:
+    invalid_cursor_exception = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid cursor",
+    )
+    try:
+        values = json.loads(
+            base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        )
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise invalid_cursor_exception
+
+    if not isinstance(values, list) or len(values) != len(order_columns):
+        raise invalid_cursor_exception
+
+    decoded_values = []
+    for value, column in zip(values, order_columns):
+        python_type = column.type.python_type
+        try:
+            if python_type in (date, datetime, time):
+                value = python_type.fromisoformat(value)
+            elif not isinstance(value, python_type):
+                raise TypeError
+        except (TypeError, ValueError):
+            raise invalid_cursor_exception
+        decoded_values.append(value)
+
+    return tuple(decoded_values)
+
+
+def get_keyset_page_query(
+    query: Select, cursor: str | None, size: int, order_columns: tuple
+):
+    """Rows after the cursor in sort key order, one extra to spot a next page.
+
+    Seeks with a row value comparison, so any page costs an index range
+    scan on the sort key however deep it is, unlike OFFSET.
+    """
+    if cursor is not None:
+        query = query.where(
+            tuple_(*order_columns)
+            > tuple_(
+                *decode_cursor(cursor=cursor, order_columns=order_columns)
+            )
+        )
+
+    return query.order_by(*order_columns).limit(size + 1)
+
+
+async def keyset_paginate(
+    query: Select, params: KeysetPageParams, db: AsyncSession
+) -> KeysetPage:
+    """Keyset counterpart of fastapi_pagination's paginate for *_query()"""
+    order_columns = get_keyset_order_columns(query=query)
+
+    result = await db.scalars(
+        get_keyset_page_query(
+            query=query,
+            cursor=params.cursor,
+            size=params.size,
+            order_columns=order_columns,
+        )
+    )
+    items = result.unique().all()
+
+    next_cursor = None
+    if len(items) > params.size:
+        items = items[: params.size]
+        next_cursor = encode_cursor(
+            values=tuple(
+                getattr(items[-1], column.key) for column in order_columns
+            )
+        )
+
+    return KeysetPage(items=items, next_cursor=next_cursor)
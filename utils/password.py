@@ -1,8 +1,23 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+
 from passlib.context import CryptContext
 
+from secret import secret
+
+from utils import metrics
+
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Jobs submitted to the password executor and not done yet
+_queued_lock = threading.Lock()
+_queued = 0
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify if the provided plain and hashed password strings match"""
@@ -12,3 +27,102 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     """Generate a hash for the provided password string"""
     return pwd_context.hash(password)
+
+
+@lru_cache(maxsize=None)
+def get_password_executor() -> ThreadPoolExecutor:
+    """Return the process wide pool bcrypt runs on.
+
+    bcrypt releases the GIL, so threads hash in parallel. The pool size
+    caps the CPU a login storm can take, the excess waits in its queue.
+    """
+    return ThreadPoolExecutor(
+        max_workers=secret.PASSWORD_HASHING_MAX_WORKERS,
+        thread_name_prefix="password-hashing",
+    )
+
+
+@lru_cache(maxsize=None)
+def get_password_import_executor() -> ProcessPoolExecutor:
+    """Return the pool bulk imports hash on, apart from the logins' pool.
+
+    Spawned rather than forked, a fork would copy the API's event loop
+    and open connections.
+    """
+    return ProcessPoolExecutor(
+        max_workers=secret.PASSWORD_IMPORT_MAX_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def _set_queued(delta: int) -> None:
+    global _queued
+    with _queued_lock:
+        _queued += delta
+        queued = _queued
+
+    metrics.set_gauge("password_hashing_queued", queued)
+
+
+def _run_timed(operation: str, submitted_at: float, function, *args):
+    started_at = time.perf_counter()
+    metrics.observe_histogram(
+        "password_hashing_queue_seconds",
+        started_at - submitted_at,
+        labels={"operation": operation},
+    )
+    try:
+        return function(*args)
+    finally:
+        metrics.observe_histogram(
+            "password_hashing_seconds",
+            time.perf_counter() - started_at,
+            labels={"operation": operation},
+        )
+
+
+async def _run_in_password_executor(operation: str, function, *args):
+    _set_queued(delta=1)
+
+    future = get_password_executor().submit(
+        _run_timed, operation, time.perf_counter(), function, *args
+    )
+    # Also runs when a cancelled request cancels the job still in the queue,
+    # which _run_timed never sees
+    future.add_done_callback(lambda _: _set_queued(delta=-1))
+
+    return await asyncio.wrap_future(future)
+
+
+async def verify_password_async(
+    plain_password: str, hashed_password: str
+) -> bool:
+    """verify_password off the event loop"""
+    return await _run_in_password_executor(
+        "verify", verify_password, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash off the event loop"""
+    return await _run_in_password_executor("hash", get_password_hash, password)
+
+
+async def get_password_hashes_async(passwords: list[str]) -> list[str]:
+    """Hash many passwords across every core, for bulk imports"""
+    started_at = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    executor = get_password_import_executor()
+
+    hashed_passwords = await asyncio.gather(
+        *(
+            loop.run_in_executor(executor, get_password_hash, password)
+            for password in passwords
+        )
+    )
+
+    metrics.observe_histogram(
+        "password_import_hashing_seconds", time.perf_counter() - started_at
+    )
+
+    return list(hashed_passwords)
@@ -0,0 +1,18 @@
+from functools import lru_cache
+
+import redis
+import redis.asyncio
+
+from secret import secret
+
+
+@lru_cache(maxsize=None)
+def get_redis_client() -> redis.Redis:
+    """Return the process wide (sync) Redis client"""
+    return redis.Redis.from_url(secret.REDIS_URL)
+
+
+@lru_cache(maxsize=None)
+def get_async_redis_client() -> redis.asyncio.Redis:
+    """Return the process wide asyncio Redis client of the API"""
+    return redis.asyncio.Redis.from_url(secret.REDIS_URL)